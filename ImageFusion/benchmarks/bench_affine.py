@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import numpy as np
+from scipy.ndimage import affine_transform
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from source.affineresample import affine_resample
+
+# Wall time of the order 1 affine resample behind TransformControls.apply_transform:
+# single-threaded ndimage (before) against the slab-parallel engines per worker count.
+#
+#   python benchmarks/bench_affine.py [size ...]
+
+def make_volume(size):
+    # smooth blobs plus noise, uint16 like the displayed volumes
+    z, y, x = np.ogrid[:size, :size, :size]
+    X = np.sin(z / 9.0) * np.cos(y / 13.0) * np.sin(x / 7.0)
+    X = (X + 1) * 30000 + np.random.default_rng(0).integers(0, 2000, (size, size, size))
+    return X.astype(np.uint16)
+
+def make_transform(size):
+    # small rotation about z plus a shift, about the volume center
+    angle = np.deg2rad(7)
+    matrix = np.array([[1, 0, 0],
+                       [0, np.cos(angle), -np.sin(angle)],
+                       [0, np.sin(angle), np.cos(angle)]])
+    center = np.full(3, (size - 1) / 2)
+    offset = center - matrix @ center + np.array([1.5, -2.25, 3.0])
+    return matrix, offset
+
+def run(method, X, matrix, offset, out, workers):
+    start = time.perf_counter()
+    if method == 'single':
+        affine_transform(X, matrix, offset=offset, output=out, order=1)
+    else:
+        affine_resample(X, matrix, offset, out=out, engine=method, workers=workers)
+    return time.perf_counter() - start
+
+def main():
+    sizes = [int(v) for v in sys.argv[1:]] or [256, 512]
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, cores} & set(range(1, cores + 1)))
+
+    # compile the numba kernel outside the timings
+    small = make_volume(8)
+    affine_resample(small, *make_transform(8), engine='numba')
+
+    print(f'{cores} cores')
+    print('{:>6} | {:>8} | {:>7} | {:>7} | {:>7}'.format('SIZE', 'METHOD', 'WORKERS', 'TIME S', 'SPEEDUP'))
+    print('{:->7}|{:->10}|{:->9}|{:->9}|{:->8}'.format('', '', '', '', ''))
+
+    for size in sizes:
+        X = make_volume(size)
+        matrix, offset = make_transform(size)
+        out = np.empty_like(X)
+
+        reference = run('single', X, matrix, offset, out, 1)
+        expected = out.copy()
+        print(f'{size:>5}³ | {"single":>8} | {1:>7} | {reference:>7.2f} | {1:>7.2f}')
+
+        for method in ['threads', 'numba']:
+            for workers in worker_counts:
+                elapsed = run(method, X, matrix, offset, out, workers)
+                # the engines reproduce ndimage voxel for voxel
+                assert np.array_equal(out, expected), method
+                print(f'{size:>5}³ | {method:>8} | {workers:>7} | {elapsed:>7.2f} | {reference / elapsed:>7.2f}')
+    return 0
+
+if __name__ == "__main__":
+    main()
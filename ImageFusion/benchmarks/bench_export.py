@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import pydicom as dicom
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Throughput and compression ratio of the multi-frame DICOM export for each
+# transfer syntax with a local codec, against the uncompressed path.
+#
+#   python benchmarks/bench_export.py [depth] [rows] [cols] [workers]
+
+def make_volume(shape):
+    # smooth structure plus noise, closer to a reconstruction than white noise
+    rng = np.random.default_rng(0)
+    z, y, x = np.meshgrid(*[np.linspace(-1, 1, n, dtype=np.float32) for n in shape], indexing='ij')
+    X = 20000 * np.exp(-4 * (x**2 + y**2 + z**2)) + 5000 * (np.sin(12 * x) * np.cos(9 * y) > 0)
+    X += rng.normal(0, 300, shape).astype(np.float32)
+    return np.clip(X, 0, 65535).astype(np.uint16)
+
+def make_template():
+    dcm = dicom.Dataset()
+    dcm.PatientName = "Benchmark"
+    dcm.PatientID = "0"
+    dcm.Modality = "OT"
+    dcm.StudyInstanceUID = dicom.uid.generate_uid()
+    dcm.SeriesInstanceUID = dicom.uid.generate_uid()
+    dcm.SOPInstanceUID = dicom.uid.generate_uid()
+    dcm.SliceThickness = "1.0"
+    dcm.PixelSpacing = ["1.0", "1.0"]
+    return dcm
+
+def main():
+    from source.dicomexporter import DicomExporter, TRANSFER_SYNTAXES, get_available_transfer_syntaxes
+
+    shape = [int(v) for v in sys.argv[1:4]] if len(sys.argv) >= 4 else [128, 512, 512]
+    workers = int(sys.argv[4]) if len(sys.argv) == 5 else os.cpu_count()
+
+    X = make_volume(shape)
+    template = make_template()
+    raw_mb = X.nbytes / 1024**2
+
+    print(f'uint16 volume {shape[0]} x {shape[1]} x {shape[2]} ({raw_mb:.1f} MB), {workers} workers')
+    print('{:>20} | {:>7} | {:>7} | {:>9} | {:>5}'.format('TRANSFER SYNTAX', 'TIME S', 'MB/S', 'FILE MB', 'RATIO'))
+    print('{:->21}|{:->9}|{:->9}|{:->11}|{:->6}'.format('', '', '', '', ''))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in get_available_transfer_syntaxes():
+            file_path = os.path.join(directory, f'{TRANSFER_SYNTAXES[name]}.dcm')
+            exporter = DicomExporter(X, template, file_path, transfer_syntax=TRANSFER_SYNTAXES[name], workers=workers)
+
+            start = time.perf_counter()
+            exporter.run()
+            elapsed = time.perf_counter() - start
+            if exporter.error:
+                print(f'{name:>20} | failed: {exporter.error}')
+                continue
+
+            file_mb = os.path.getsize(file_path) / 1024**2
+            print(f'{name:>20} | {elapsed:>7.2f} | {raw_mb / elapsed:>7.1f} | {file_mb:>9.1f} | {raw_mb / file_mb:>5.2f}')
+    return 0
+
+if __name__ == "__main__":
+    main()
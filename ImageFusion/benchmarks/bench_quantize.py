@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import subprocess
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Peak memory of the uint16 requantization in ImageData.__init__, before and after.
+# Each method runs in its own process so the reported peak RSS isn't shared.
+#
+#   python benchmarks/bench_quantize.py [depth] [rows] [cols]
+
+def get_peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        import psutil # Windows has no resource module
+        return psutil.Process().memory_info().peak_wset / 1024**2
+
+def quantize_legacy(original_X):
+    necessary_type = np.uint16
+    X = original_X.copy() - np.min(original_X)
+    max_value = np.max(X)
+    X = (X / max_value) * np.iinfo(necessary_type).max
+    intercept = np.min(original_X)
+    slope = max_value / np.iinfo(necessary_type).max
+    X = X.astype(necessary_type)
+    return X, slope, intercept
+
+def run_method(method, shape):
+    from source.quantization import quantize_to_uint16
+
+    X = np.random.default_rng(0).random(shape, dtype=np.float32)
+    baseline = get_peak_rss_mb()
+
+    start = time.perf_counter()
+    if method == 'legacy':
+        quantize_legacy(X)
+    else:
+        quantize_to_uint16(X)
+    elapsed = time.perf_counter() - start
+
+    print(f'{method:>8} | {X.nbytes / 1024**2:>9.1f} | {baseline:>13.1f} | {get_peak_rss_mb():>13.1f} | {elapsed:>7.2f}')
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--method':
+        run_method(sys.argv[2], tuple(int(v) for v in sys.argv[3:6]))
+        return 0
+
+    shape = [int(v) for v in sys.argv[1:4]] if len(sys.argv) == 4 else [256, 512, 512]
+
+    print(f'float32 volume {shape[0]} x {shape[1]} x {shape[2]}')
+    print('{:>8} | {:>9} | {:>13} | {:>13} | {:>7}'.format('METHOD', 'INPUT MB', 'RSS BEFORE MB', 'PEAK RSS MB', 'TIME S'))
+    print('{:->9}|{:->11}|{:->15}|{:->15}|{:->8}'.format('', '', '', '', ''))
+
+    for method in ['legacy', 'slab']:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--method', method, *[str(v) for v in shape]], check=True)
+    return 0
+
+if __name__ == "__main__":
+    main()
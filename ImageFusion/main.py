@@ -1,4 +1,5 @@
 import tkinter as tk
+import threading
 
 # custom modules
 from source.imagecontrols import ImageControls
@@ -7,6 +8,9 @@ from source.scannerpanel import ScannerPanel
 from source.imageview import ImageView
 from source.imagedata import ImageData
 from source.dualimageview import DualImageView
+from source.renderscheduler import RenderScheduler
+from source.framecache import FrameCache
+from source.transformpreview import TransformPreview
 
 # TODO:
     # fix display issue for slope/inetrcept values
@@ -27,6 +31,7 @@ class App(tk.Tk):
         # --- Debug init --- #
         
         data_path = 'D:/Code/Code_Research/Projects/ImageFusion/data/'
+        cache_path = data_path + 'cache/'
         
         # PET Images (stored as 3D .tifs)
         
@@ -41,27 +46,57 @@ class App(tk.Tk):
         
         # PET_image_path = data_path + 'ALIGNED_CT--TRIT71120LR_Zeego_CBCT_Recon.dcm'
         
-        file_properties = {"path": PET_image_path, "vxl_dim_size": 0.5}
-        self.X_PET = ImageData(file_properties)
+        file_properties = {"path": PET_image_path, "vxl_dim_size": 0.5, "cache_dir": cache_path}
+        self.X_PET = ImageData(file_properties, load=False)
         
         # CT Images (stored as series of .IMA files)
         
         CT_dir_path = 'CT--TRIT71120LR_Zeego_CBCT_Recon/'
         CT_images_path = data_path + CT_dir_path
         
-        file_properties = {"path": CT_images_path, "transverse_axis": 0}
-        self.X_CT = ImageData(file_properties)
+        file_properties = {"path": CT_images_path, "transverse_axis": 0, "cache_dir": cache_path, "preview_step": 8}
+        self.X_CT = ImageData(file_properties, load=False)
 
         # --- Initialize App --- #
 
         # Top menu
         self.config(menu=MenuBar(self))
         
+        # views are rendered in batches, once per idle cycle
+        self.render_scheduler = RenderScheduler(self)
+        self.frame_cache = FrameCache()
+        for image_data in (self.X_CT, self.X_PET):
+            image_data.invalidate_callbacks.append(self.frame_cache.evict_stale)
+        
+        # CT planes through a computed, not yet applied, transform
+        self.transform_preview = TransformPreview(self.X_CT)
+        
         # Scanner panels
         self.panel_1 = ScannerPanel(self)
         self.panel_2 = ScannerPanel(self)
         self.panel_3 = ScannerPanel(self)
         
+        # --- Load Images --- #
+        
+        # volumes load on worker threads; views are built as soon as both volume
+        # geometries are known and fill in while the slices are decoded
+        self.views_initialized = False
+        self.loading_images = [0, 1]
+        self.loading_slices = [-1, -1]
+        self.image_loads = [(self.X_CT, self.panel_1), (self.X_PET, self.panel_2)]
+        
+        for image_data, panel in self.image_loads:
+            panel.show_progress(f'Loading {image_data.file_properties["path"]}')
+            threading.Thread(target=self.load_image, args=(image_data,), daemon=True).start()
+        self.panel_3.show_progress('Waiting for images')
+        
+        self.after(100, self.poll_loading)
+        
+        # run
+        self.mainloop()
+    
+    def init_views(self):
+        
         # Image views
         self.image_1_view_1 = ImageView(self, self.panel_1.image_view_1, self.X_CT, view=0)
         self.image_1_view_2 = ImageView(self, self.panel_1.image_view_2, self.X_CT, view=1)
@@ -87,6 +122,7 @@ class App(tk.Tk):
 
         # --- Initialize Views --- #
         
+        # middle slices (0 mm) are decoded first
         self.panel_1_controls.view_controls.set_view_slice(0, 0, 'by_mm', original_call=False)
         self.panel_1_controls.view_controls.set_view_slice(1, 0, 'by_mm', original_call=False)
         self.panel_1_controls.view_controls.set_view_slice(2, 0, 'by_mm', original_call=False)
@@ -95,52 +131,74 @@ class App(tk.Tk):
         self.panel_2_controls.view_controls.set_view_slice(1, 0, 'by_mm', original_call=False)
         self.panel_2_controls.view_controls.set_view_slice(2, 0, 'by_mm', original_call=False)
         
-        self.refresh_data()
-        self.refresh_graphics()
-        
-        # run
-        self.mainloop()
+        self.panel_3.hide_progress()
+        self.views_initialized = True
     
-    def refresh_graphics(self):
-        
-        self.panel_1_controls.view_controls.update_crosshairs()
-        self.panel_2_controls.view_controls.update_crosshairs()
-        
-        self.image_1_view_1.draw()
-        self.image_1_view_2.draw()
-        self.image_1_view_3.draw()
-        
-        self.image_2_view_1.draw()
-        self.image_2_view_2.draw()
-        self.image_2_view_3.draw()
-        
-        self.image_3_view_1.draw()
-        self.image_3_view_2.draw()
-        self.image_3_view_3.draw()
-        
-    def refresh_data(self):
-        
-        self.image_1_view_1.update_data()
-        self.image_1_view_2.update_data()
-        self.image_1_view_3.update_data()
-        
-        self.image_2_view_1.update_data()
-        self.image_2_view_2.update_data()
-        self.image_2_view_3.update_data()
-        
-        self.image_3_view_1.update_data()
-        self.image_3_view_2.update_data()
-        self.image_3_view_3.update_data()
-        
-    def reload_slices(self):
+    # --- Loading --- #
+    
+    def load_image(self, image_data):
+        try:
+            image_data.probe()
+            image_data.load()
+        except Exception as e:
+            image_data.load_error = e
+    
+    def poll_loading(self):
+        
+        # an image that fails before it is probed leaves the views unbuilt, the
+        # other one keeps reporting progress until it is loaded
+        failed = [image_data.file_properties['path'] for image_data, _ in self.image_loads
+                  if image_data.load_error and not image_data.probed]
+        
+        for index in list(self.loading_images):
+            image_data, panel = self.image_loads[index]
+            
+            if image_data.load_error:
+                panel.set_progress(0.0, f'Loading failed: {image_data.load_error}')
+                print(f'Loading failed: {image_data.file_properties["path"]}: {image_data.load_error}')
+                self.loading_images.remove(index)
+                continue
+            
+            done, total = image_data.load_progress
+            if total:
+                stage = 'Quick look shown, loading' if image_data.preview_ready else 'Loading'
+                panel.set_progress(done / total, f'{stage} {done}/{total} slices')
+            
+            if not self.views_initialized:
+                if image_data.loaded and failed:
+                    panel.set_progress(1.0, f'Loaded, not shown: {", ".join(failed)} failed')
+                    self.loading_images.remove(index)
+                continue
+            
+            if image_data.loaded:
+                self.finish_loading(index)
+                self.loading_images.remove(index)
+            elif image_data.loaded_slices != self.loading_slices[index]:
+                # cached slice copies are stale while the volume fills in
+                self.loading_slices[index] = image_data.loaded_slices
+                image_data.invalidate_slices()
+                self.render_scheduler.mark_image(self.controls[index].view_controls)
+        
+        if not self.views_initialized:
+            if self.X_CT.probed and self.X_PET.probed:
+                self.init_views()
+            elif failed:
+                self.panel_3.set_progress(0.0, f'Loading failed: {", ".join(failed)}')
+        
+        if self.loading_images or not (self.views_initialized or failed):
+            self.after(100, self.poll_loading)
+    
+    def finish_loading(self, index):
+        image_data, panel = self.image_loads[index]
+        view_controls = self.controls[index].view_controls
         
-        self.image_1_view_1.reload_slice()
-        self.image_1_view_2.reload_slice()
-        self.image_1_view_3.reload_slice()
+        # final quantization and intensity range are only known now
+        image_data.invalidate_slices()
+        view_controls.draw_histogram()
+        view_controls.set_intensity(None, None, None)
         
-        self.image_2_view_1.reload_slice()
-        self.image_2_view_2.reload_slice()
-        self.image_2_view_3.reload_slice()
+        self.render_scheduler.mark_image(view_controls)
+        panel.hide_progress()
 
 class MenuBar(tk.Menu):
     
@@ -0,0 +1,73 @@
+import os
+import numpy as np
+import numba
+from numba import njit, prange
+from concurrent.futures import ThreadPoolExecutor
+from scipy.ndimage import affine_transform
+
+ENGINES = ('threads', 'numba')
+
+def affine_resample(X, matrix, offset, out=None, engine='threads', workers=None, slab_size=8):
+    # order 1 resampling with scipy.ndimage.affine_transform semantics (input
+    # coordinate = matrix @ output coordinate + offset, 0 outside the input),
+    # split into output z-slabs written straight into one preallocated volume
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown resampling engine {engine!r}, expected one of {ENGINES}!")
+
+    X = np.ascontiguousarray(X)
+    matrix = np.asarray(matrix, dtype=np.float64)
+    offset = np.asarray(offset, dtype=np.float64)
+    if out is None:
+        out = np.empty(X.shape, dtype=X.dtype)
+    workers = workers or os.cpu_count() or 1
+
+    if engine == 'numba':
+        numba.set_num_threads(min(workers, numba.config.NUMBA_NUM_THREADS))
+        # ndimage rounds to integer outputs only
+        resample_linear_kernel(X, matrix, offset, out, np.issubdtype(out.dtype, np.integer))
+        return out
+
+    # ndimage releases the GIL, so slabs run in parallel on plain threads
+    def resample_slab(start):
+        stop = min(start + slab_size, out.shape[0])
+        affine_transform(X, matrix, offset=offset + matrix[:, 0] * start,
+                         output_shape=(stop - start,) + out.shape[1:],
+                         output=out[start:stop], order=1)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(resample_slab, range(0, out.shape[0], slab_size)))
+    return out
+
+@njit(parallel=True, cache=True)
+def resample_linear_kernel(X, matrix, offset, out, rounding):
+    # trilinear, one output z-slice per prange iteration
+    n0, n1, n2 = X.shape
+    for z in prange(out.shape[0]):
+        for y in range(out.shape[1]):
+            row0 = matrix[0, 0] * z + matrix[0, 1] * y + offset[0]
+            row1 = matrix[1, 0] * z + matrix[1, 1] * y + offset[1]
+            row2 = matrix[2, 0] * z + matrix[2, 1] * y + offset[2]
+            for x in range(out.shape[2]):
+                p0 = row0 + matrix[0, 2] * x
+                p1 = row1 + matrix[1, 2] * x
+                p2 = row2 + matrix[2, 2] * x
+                if p0 < 0 or p1 < 0 or p2 < 0 or p0 > n0 - 1 or p1 > n1 - 1 or p2 > n2 - 1:
+                    out[z, y, x] = 0
+                    continue
+
+                a0 = min(int(p0), n0 - 1)
+                a1 = min(int(p1), n1 - 1)
+                a2 = min(int(p2), n2 - 1)
+                b0 = min(a0 + 1, n0 - 1)
+                b1 = min(a1 + 1, n1 - 1)
+                b2 = min(a2 + 1, n2 - 1)
+                w0 = p0 - a0
+                w1 = p1 - a1
+                w2 = p2 - a2
+
+                low = (X[a0, a1, a2] * (1 - w2) + X[a0, a1, b2] * w2) * (1 - w1) \
+                    + (X[a0, b1, a2] * (1 - w2) + X[a0, b1, b2] * w2) * w1
+                high = (X[b0, a1, a2] * (1 - w2) + X[b0, a1, b2] * w2) * (1 - w1) \
+                     + (X[b0, b1, a2] * (1 - w2) + X[b0, b1, b2] * w2) * w1
+                value = low * (1 - w0) + high * w0
+                out[z, y, x] = round(value) if rounding else value
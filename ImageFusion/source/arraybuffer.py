@@ -0,0 +1,97 @@
+import io
+import numpy as np
+
+class ArrayBuffer(io.RawIOBase):
+
+    # Read-only file-like view over a C-contiguous array, so pydicom can stream
+    # an array into PixelData at save time without a tobytes() copy.
+
+    def __init__(self, X):
+        super().__init__()
+        if not X.flags.c_contiguous:
+            raise ValueError("ArrayBuffer requires a C-contiguous array!")
+        self.X = X
+        self.view = memoryview(X).cast('B')
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else: # whence == io.SEEK_END
+            self.position = len(self.view) + offset
+        return self.position
+
+    def readinto(self, buffer):
+        count = max(0, min(len(buffer), len(self.view) - self.position))
+        buffer[:count] = self.view[self.position:self.position + count]
+        self.position += count
+        return count
+
+class FrameBuffer(io.RawIOBase):
+
+    # Read-only file-like view over the frames of a volume of any layout (views,
+    # lazy volumes). Only the frame being read is made contiguous, so the whole
+    # volume is never copied; frame_callback(index) runs before each frame.
+
+    def __init__(self, X, frame_callback=None):
+        super().__init__()
+        self.X = X
+        self.frame_callback = frame_callback
+        self.frame_bytes = int(np.prod(X.shape[1:])) * X.dtype.itemsize
+        self.length = X.shape[0] * self.frame_bytes
+        self.position = 0
+        self.frame_index = None
+        self.frame = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else: # whence == io.SEEK_END
+            self.position = self.length + offset
+        return self.position
+
+    def load_frame(self, index):
+        if index != self.frame_index:
+            if self.frame_callback:
+                self.frame_callback(index)
+            self.frame = memoryview(np.ascontiguousarray(self.X[index])).cast('B')
+            self.frame_index = index
+        return self.frame
+
+    def readinto(self, buffer):
+        if self.position >= self.length:
+            return 0
+        index, offset = divmod(self.position, self.frame_bytes)
+        frame = self.load_frame(index)
+        count = min(len(buffer), self.frame_bytes - offset)
+        buffer[:count] = frame[offset:offset + count]
+        self.position += count
+        return count
+
+def get_pixel_data_value(X, frame_callback=None):
+    # buffered element values are written chunk by chunk (pydicom >= 3)
+    if isinstance(X, np.ndarray) and X.flags.c_contiguous and frame_callback is None:
+        return io.BufferedReader(ArrayBuffer(X))
+    return io.BufferedReader(FrameBuffer(X, frame_callback))
@@ -0,0 +1,37 @@
+class BlitMixIn:
+
+    # Fast redraw for figures where only a few artists change between frames.
+    # Those artists are marked animated, so a full draw renders everything else
+    # (axes, labels, colorbar) once; the result is kept as the background, and
+    # later frames restore it and redraw only the animated artists.
+
+    def make_blittable(self, artists):
+        self.blit_artists = artists
+        self.blit_background = None
+        self.full_draw_pending = True
+
+        for artist in self.blit_artists:
+            artist.set_animated(True)
+        self.canvas.mpl_connect('draw_event', self.on_draw_event)
+
+    def on_draw_event(self, event):
+        # runs inside every full draw, including the ones caused by resizes
+        self.blit_background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_blit_artists()
+        self.full_draw_pending = False
+
+    def draw_blit_artists(self):
+        for artist in self.blit_artists:
+            self.ax.draw_artist(artist)
+
+    def request_full_draw(self):
+        self.full_draw_pending = True
+
+    def blit_draw(self):
+        if self.full_draw_pending or self.blit_background is None:
+            self.canvas.draw_idle()
+            return
+
+        self.canvas.restore_region(self.blit_background)
+        self.draw_blit_artists()
+        self.canvas.blit(self.fig.bbox)
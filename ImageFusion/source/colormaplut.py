@@ -0,0 +1,23 @@
+import numpy as np
+import matplotlib
+from functools import lru_cache
+
+UINT16_LEVELS = np.iinfo(np.uint16).max + 1
+
+@lru_cache(maxsize=16)
+def get_colormap_lut(cmap, vmin, vmax):
+    # RGBA (uint8) for every uint16 value under one colormap and window, so a
+    # slice is colored with a single gather instead of clip + normalize + map
+    values = np.arange(UINT16_LEVELS, dtype=np.float64)
+    if vmax > vmin:
+        normalized = np.clip((values - vmin) / (vmax - vmin), 0.0, 1.0)
+    else:
+        # collapsed window maps everything to the bottom, as matplotlib's Normalize
+        normalized = np.zeros_like(values, dtype=np.float64)
+
+    lut = matplotlib.colormaps[cmap](normalized, bytes=True)
+    lut.flags.writeable = False # shared between views
+    return lut
+
+def apply_colormap_lut(image_slice, lut):
+    return np.take(lut, image_slice, axis=0)
@@ -0,0 +1,140 @@
+import numpy as np
+
+BACKGROUND = 255 # white, like the axes behind the layers
+
+class Compositor:
+
+    # Fuses a base RGBA slice and an overlay slice into one RGBA frame. The frame
+    # uses the base layer's pixel size and spans both extents. The overlay values
+    # are resampled bilinearly through per-axis index/weight maps that are kept
+    # while both grids stay the same, then colored; opacity changes only redo the blend.
+
+    def __init__(self):
+        self.grid_key = None
+        self.extent = None
+        self.base_layer = None
+        self.overlay_values = None
+        self.overlay_layer = None
+        self.overlay_window = None
+        self.frame = None
+        self.buffer = None
+
+    # --- Grid --- #
+
+    def set_grid(self, base_extent, base_shape, overlay_extent, overlay_shape):
+        grid_key = (tuple(base_extent), tuple(base_shape[:2]), tuple(overlay_extent), tuple(overlay_shape[:2]))
+        if grid_key == self.grid_key:
+            return
+        self.grid_key = grid_key
+
+        # base pixel size over the union of both extents
+        left, right, bottom, top = base_extent
+        pixel_x = (right - left) / base_shape[1]
+        pixel_y = (top - bottom) / base_shape[0]
+        left, right = min(left, overlay_extent[0]), max(right, overlay_extent[1])
+        bottom, top = min(bottom, overlay_extent[2]), max(top, overlay_extent[3])
+        columns = max(1, int(np.round((right - left) / pixel_x)))
+        rows = max(1, int(np.round((top - bottom) / pixel_y)))
+        self.extent = [left, left + columns * pixel_x, bottom, bottom + rows * pixel_y]
+        self.shape = (rows, columns)
+
+        self.base_map = self.get_index_map(base_extent, base_shape)
+        self.overlay_map = self.get_linear_map(overlay_extent, overlay_shape)
+        self.overlay_window = tuple(window for window, *_ in self.overlay_map)
+
+    def get_frame_centers(self, axis):
+        frame_low, frame_high = self.extent[2 * (1 - axis)], self.extent[2 * (1 - axis) + 1]
+        n_frame = self.shape[axis]
+        return frame_low + (np.arange(n_frame) + 0.5) * (frame_high - frame_low) / n_frame
+
+    def get_index_map(self, extent, shape):
+        # nearest source row/column of every frame row/column (axis-aligned, so
+        # the map is separable), cut to the window where the layer has data
+        maps = []
+        for axis, (low, high) in enumerate([(extent[2], extent[3]), (extent[0], extent[1])]):
+            centers = self.get_frame_centers(axis)
+            indices = np.floor((centers - low) / (high - low) * shape[axis]).astype(np.intp)
+
+            valid = np.flatnonzero((indices >= 0) & (indices < shape[axis]))
+            start, stop = (valid[0], valid[-1] + 1) if valid.size else (0, 0)
+            maps.append((slice(start, stop), indices[start:stop]))
+        return maps
+
+    def get_linear_map(self, extent, shape):
+        # the two neighbouring source rows/columns and the weight of the second,
+        # for every frame row/column inside the layer's extent
+        maps = []
+        for axis, (low, high) in enumerate([(extent[2], extent[3]), (extent[0], extent[1])]):
+            centers = self.get_frame_centers(axis)
+            position = (centers - low) / (high - low) * shape[axis] - 0.5
+
+            valid = np.flatnonzero((position >= -0.5) & (position <= shape[axis] - 0.5))
+            start, stop = (valid[0], valid[-1] + 1) if valid.size else (0, 0)
+            position = np.clip(position[start:stop], 0, shape[axis] - 1)
+
+            lower = np.floor(position).astype(np.intp)
+            upper = np.minimum(lower + 1, shape[axis] - 1)
+            weight = (position - lower).astype(np.float32)
+            maps.append((slice(start, stop), lower, upper, weight))
+        return maps
+
+    @staticmethod
+    def resample(layer, index_map):
+        (_, rows), (_, columns) = index_map
+        if rows.size == layer.shape[0] and columns.size == layer.shape[1] \
+           and (rows == np.arange(rows.size)).all() and (columns == np.arange(columns.size)).all():
+            return layer
+        return layer[rows[:, None], columns[None, :]]
+
+    @staticmethod
+    def resample_linear(values, linear_map):
+        # separable bilinear interpolation: rows first, then columns
+        (_, row_lower, row_upper, row_weight), (_, column_lower, column_upper, column_weight) = linear_map
+        row_weight = row_weight[:, None]
+        rows = values[row_lower].astype(np.float32)
+        rows *= 1 - row_weight
+        rows += values[row_upper] * row_weight
+
+        resampled = rows[:, column_lower]
+        resampled *= 1 - column_weight
+        resampled += rows[:, column_upper] * column_weight
+        return resampled
+
+    # --- Layers --- #
+
+    def set_base(self, base_rgba):
+        base_window = tuple(window for window, _ in self.base_map)
+        self.base_layer = np.full(self.shape + (4,), BACKGROUND, dtype=np.uint8)
+        self.base_layer[base_window] = self.resample(base_rgba, self.base_map)
+
+    def set_overlay(self, overlay_values):
+        resampled = self.resample_linear(overlay_values, self.overlay_map)
+        if np.issubdtype(overlay_values.dtype, np.integer):
+            resampled = np.rint(resampled, out=resampled).astype(overlay_values.dtype)
+        self.overlay_values = resampled
+
+    def color_overlay(self, colorize):
+        # recoloring (window, colormap) reuses the resampled values
+        self.overlay_layer = colorize(self.overlay_values)
+
+    # --- Blending --- #
+
+    def blend(self, opacity):
+        # integer blend in 1/256 steps: (base * (256 - w) + overlay * w) >> 8
+        if self.frame is None or self.frame.shape != self.base_layer.shape:
+            self.frame = np.empty_like(self.base_layer)
+        np.copyto(self.frame, self.base_layer)
+
+        weight = int(np.round(np.clip(opacity, 0.0, 1.0) * 256))
+        base = self.base_layer[self.overlay_window]
+        if base.size and weight:
+            if self.buffer is None or self.buffer.shape != base.shape:
+                self.buffer = np.empty(base.shape, dtype=np.uint16)
+            np.multiply(base, 256 - weight, out=self.buffer, dtype=np.uint16)
+            self.buffer += self.overlay_layer.astype(np.uint16) * weight
+            self.buffer += 128
+            self.buffer >>= 8
+            self.frame[self.overlay_window] = self.buffer
+
+        self.frame[..., 3] = 255
+        return self.frame
@@ -0,0 +1,245 @@
+import os
+import copy
+import threading
+import numpy as np
+import pydicom as dicom
+from pydicom.uid import (generate_uid, ExplicitVRLittleEndian, RLELossless, JPEGLSLossless, JPEG2000Lossless,
+                         SecondaryCaptureImageStorage, MultiFrameGrayscaleWordSecondaryCaptureImageStorage)
+from pydicom.pixels import get_encoder
+from pydicom.encaps import encapsulate
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from source.arraybuffer import get_pixel_data_value
+from source.quantization import get_min_max
+
+# lossless transfer syntaxes offered for export, by display name
+TRANSFER_SYNTAXES = {
+    "Uncompressed": ExplicitVRLittleEndian,
+    "RLE Lossless": RLELossless,
+    "JPEG-LS Lossless": JPEGLSLossless,
+    "JPEG 2000 Lossless": JPEG2000Lossless,
+}
+
+def get_available_transfer_syntaxes():
+    # compressed syntaxes are only listed when a local codec can encode them
+    return [name for name, uid in TRANSFER_SYNTAXES.items()
+            if uid == ExplicitVRLittleEndian or get_encoder(uid).is_available]
+
+def encode_frame(frame, transfer_syntax, pixel_kwargs):
+    # module level so frames can be encoded in worker processes
+    return get_encoder(transfer_syntax).encode(frame, **pixel_kwargs)
+
+class ExportCancelled(Exception):
+    pass
+
+class DicomExporter:
+
+    # Writes a volume to DICOM on a worker thread, either as one multi-frame file
+    # streamed to disk frame by frame or as a one-file-per-slice series written on
+    # a worker pool. progress, error and finished are polled by the UI.
+
+    def __init__(self, X, template, file_path, mode='multiframe', transfer_syntax=ExplicitVRLittleEndian, workers=None):
+
+        self.X = X
+        self.template = copy.deepcopy(template)
+        self.file_path = file_path
+        self.mode = mode
+        self.transfer_syntax = transfer_syntax
+        self.compressed = transfer_syntax != ExplicitVRLittleEndian
+        self.workers = workers if workers else os.cpu_count()
+
+        self.progress = [0, X.shape[0]]
+        self.progress_lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.error = None
+        self.finished = False
+        self.thread = None
+
+    # --- Control --- #
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def report_progress(self):
+        with self.progress_lock:
+            self.progress[0] += 1
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise ExportCancelled()
+
+    def run(self):
+        try:
+            self.set_pixel_description()
+            self.set_window()
+            if self.mode == 'series':
+                self.write_series()
+            else:
+                self.write_multiframe()
+        except ExportCancelled:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+
+    # --- Header --- #
+
+    def set_pixel_description(self):
+        dcm = self.template
+        dcm.Rows, dcm.Columns = self.X.shape[1], self.X.shape[2]
+        dcm.SamplesPerPixel = 1
+        dcm.BitsAllocated = dcm.BitsStored = 8 * self.X.dtype.itemsize
+        dcm.HighBit = dcm.BitsStored - 1
+        dcm.PixelRepresentation = 1 if self.X.dtype.kind == 'i' else 0
+        dcm.PhotometricInterpretation = "MONOCHROME2"
+
+        if 'SOPClassUID' not in dcm:
+            # generated templates carry no SOP class; written files need one
+            multiframe = self.mode != 'series'
+            dcm.SOPClassUID = MultiFrameGrayscaleWordSecondaryCaptureImageStorage if multiframe else SecondaryCaptureImageStorage
+
+        if getattr(dcm, 'file_meta', None) is None:
+            dcm.file_meta = dicom.dataset.FileMetaDataset()
+        dcm.file_meta.TransferSyntaxUID = self.transfer_syntax
+
+    def get_pixel_kwargs(self):
+        dcm = self.template
+        return {
+            'rows': dcm.Rows,
+            'columns': dcm.Columns,
+            'samples_per_pixel': 1,
+            'bits_allocated': dcm.BitsAllocated,
+            'bits_stored': dcm.BitsStored,
+            'pixel_representation': dcm.PixelRepresentation,
+            'photometric_interpretation': dcm.PhotometricInterpretation,
+            'number_of_frames': 1,
+        }
+
+    def set_window(self):
+        # full-scale color window, found in one slab-wise pass
+        min_value, max_value = get_min_max(self.X)
+        self.template.WindowCenter = [str((float(min_value) + float(max_value)) / 2)]
+        self.template.WindowWidth = [str(float(max_value) - float(min_value))]
+        self.template.VOILUTFunction = "LINEAR"
+
+    # --- Multi-Frame --- #
+
+    def write_multiframe(self):
+
+        def on_frame(index):
+            # frames are pulled by pydicom's writer, one at a time
+            self.check_cancelled()
+            if index:
+                self.report_progress()
+
+        dcm = self.template
+        dcm.NumberOfFrames = self.X.shape[0]
+        if self.compressed:
+            # encoded frames are small, so the encapsulated payload is built in memory
+            dcm.PixelData = encapsulate([frame for _, frame in self.encode_frames()])
+            dcm['PixelData'].VR = 'OB'
+            dcm['PixelData'].is_undefined_length = True
+        else:
+            dcm.PixelData = get_pixel_data_value(self.X, frame_callback=on_frame)
+            dcm['PixelData'].VR = 'OW'
+
+        try:
+            dcm.save_as(self.file_path, enforce_file_format=True)
+        except ExportCancelled:
+            self.remove_files([self.file_path])
+            raise
+        finally:
+            del dcm.PixelData
+        if not self.compressed:
+            self.report_progress()
+
+    # --- Compression --- #
+
+    def encode_frames(self):
+        # frames are encoded in parallel worker processes (the codecs don't all
+        # release the GIL); only a bounded window of frames is in flight and the
+        # encoded frames are yielded in order
+        pixel_kwargs = self.get_pixel_kwargs()
+        window = 2 * self.workers
+        total = self.X.shape[0]
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = {}
+            next_index = 0
+            try:
+                for index in range(total):
+                    while next_index < total and len(pending) < window:
+                        frame = np.ascontiguousarray(self.X[next_index])
+                        pending[next_index] = executor.submit(encode_frame, frame, self.transfer_syntax, pixel_kwargs)
+                        next_index += 1
+
+                    encoded = pending.pop(index).result()
+                    self.check_cancelled()
+                    self.report_progress()
+                    yield index, encoded
+            except ExportCancelled:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    # --- Series --- #
+
+    def get_series_file_path(self, index):
+        return os.path.join(self.file_path, f"IMG{index + 1:05d}.dcm")
+
+    def write_series(self):
+
+        template = self.template
+        for keyword in ('NumberOfFrames', 'PixelData'):
+            if keyword in template:
+                delattr(template, keyword)
+        origin = [float(value) for value in template.get('ImagePositionPatient', [0, 0, 0])]
+        spacing = float(template.get('SliceThickness', 1))
+
+        def write_slice(index, pixel_data=None):
+            self.check_cancelled()
+
+            dcm = copy.deepcopy(template)
+            dcm.InstanceNumber = index + 1
+            dcm.SOPInstanceUID = generate_uid()
+            if getattr(dcm, 'file_meta', None) is not None:
+                dcm.file_meta.MediaStorageSOPInstanceUID = dcm.SOPInstanceUID
+            dcm.ImagePositionPatient = [origin[0], origin[1], origin[2] + index * spacing]
+            dcm.SliceLocation = origin[2] + index * spacing
+            if pixel_data is None:
+                dcm.PixelData = np.ascontiguousarray(self.X[index]).tobytes()
+                dcm['PixelData'].VR = 'OW'
+                self.report_progress()
+            else:
+                dcm.PixelData = encapsulate([pixel_data])
+                dcm['PixelData'].VR = 'OB'
+                dcm['PixelData'].is_undefined_length = True
+
+            dcm.save_as(self.get_series_file_path(index), enforce_file_format=True)
+
+        created_dir = not os.path.isdir(self.file_path)
+        os.makedirs(self.file_path, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                if self.compressed:
+                    # progress is counted as frames finish encoding
+                    futures = [executor.submit(write_slice, index, encoded) for index, encoded in self.encode_frames()]
+                else:
+                    futures = [executor.submit(write_slice, index) for index in range(self.X.shape[0])]
+                for future in as_completed(futures):
+                    future.result()
+            except ExportCancelled:
+                executor.shutdown(wait=True, cancel_futures=True)
+                self.remove_files([self.get_series_file_path(index) for index in range(self.X.shape[0])])
+                if created_dir and not os.listdir(self.file_path):
+                    os.rmdir(self.file_path)
+                raise
+
+    def remove_files(self, file_paths):
+        # partial exports are not left behind on cancel
+        for file_path in file_paths:
+            if os.path.exists(file_path):
+                os.remove(file_path)
@@ -0,0 +1,142 @@
+import os
+import numpy as np
+import pydicom as dicom
+from pydicom.errors import InvalidDicomError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+class DicomSeries:
+
+    def __init__(self, files, transverse_axis=0, workers=None, progress_callback=None, series_uid=None):
+
+        self.files = files
+        self.series_uid = series_uid
+        self.series = {}
+        self.transverse_axis = transverse_axis
+        self.workers = workers if workers else os.cpu_count()
+        self.progress_callback = progress_callback
+        self.dcm = None
+        self.first_slice = None
+        self.slice_shape = None
+
+    # --- Progress --- #
+
+    def report_progress(self, done, total):
+        if self.progress_callback:
+            self.progress_callback(done, total)
+
+    # --- Header Pre-Scan --- #
+
+    def scan_headers(self):
+
+        def read_header(file_name):
+            try:
+                header = dicom.dcmread(file_name, stop_before_pixels=True)
+            except (InvalidDicomError, OSError):
+                return None
+
+            # drop anything that can't be stacked as an image slice (reports, dirs, etc.)
+            if 'Rows' not in header or 'Columns' not in header:
+                return None
+            return header
+
+        def slice_position(header):
+            if 'ImagePositionPatient' in header and 'ImageOrientationPatient' in header:
+                orientation = np.array(header.ImageOrientationPatient, dtype=float)
+                normal = np.cross(orientation[:3], orientation[3:])
+                return float(np.dot(normal, np.array(header.ImagePositionPatient, dtype=float)))
+            return None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            headers = list(executor.map(read_header, self.files))
+
+        # group image files by series
+        self.series = {}
+        for file_name, header in zip(self.files, headers):
+            if header is None:
+                continue
+            uid = str(header.get('SeriesInstanceUID', ''))
+            self.series.setdefault(uid, []).append((file_name, header))
+
+        if not self.series:
+            raise RuntimeError("Provided image directory contains no DICOM image files!")
+
+        if self.series_uid is not None:
+            if self.series_uid not in self.series:
+                raise RuntimeError(f"Series {self.series_uid} not found in provided image directory!")
+            uid = self.series_uid
+        else:
+            uid = max(self.series, key=lambda key: len(self.series[key]))
+
+        if len(self.series) > 1:
+            print(f'Found {len(self.series)} series, loading {uid} ({len(self.series[uid])} slices)')
+
+        # order slices along the slice normal, falling back to InstanceNumber then file name
+        entries = self.series[uid]
+        positions = [slice_position(header) for _, header in entries]
+        if all(position is not None for position in positions):
+            keys = positions
+        elif all('InstanceNumber' in header for _, header in entries):
+            keys = [int(header.InstanceNumber) for _, header in entries]
+        else:
+            keys = [file_name for file_name, _ in entries]
+
+        order = sorted(range(len(entries)), key=lambda index: keys[index])
+        self.series_uid = uid
+        self.files = [entries[index][0] for index in order]
+        return self.files
+
+    # --- Pixel Data --- #
+
+    def probe(self):
+        # first slice defines the volume geometry and is kept as the header template
+        self.dcm = dicom.dcmread(self.files[0])
+        self.first_slice = self.dcm.pixel_array
+        self.slice_shape = self.first_slice.shape
+
+        volume_shape = list(self.slice_shape)
+        volume_shape.insert(self.transverse_axis, len(self.files))
+        return volume_shape, self.first_slice.dtype
+
+    def read_volume(self, volume=None, slice_callback=None, phases=None, phase_callback=None):
+
+        def read_slice(index):
+            if index == 0:
+                pix = self.first_slice
+            else:
+                pix = dicom.dcmread(self.files[index]).pixel_array
+            if pix.shape != self.slice_shape:
+                raise RuntimeError(f"Slice {self.files[index]} does not match series shape {self.slice_shape}!")
+
+            stack[index] = pix
+            if slice_callback:
+                slice_callback(index)
+
+        if volume is None:
+            volume_shape, dtype = self.probe()
+            volume = np.empty(volume_shape, dtype=dtype)
+
+        # decoded slices are written straight into the volume through a stacking view
+        stack = np.moveaxis(volume, self.transverse_axis, 0)
+        total = len(self.files)
+
+        # middle slices first so a progressive display has something to show early;
+        # each phase completes before the next one starts
+        if phases is None:
+            middle = total // 2
+            phases = [sorted(range(total), key=lambda index: abs(index - middle))]
+
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for phase, order in enumerate(phases):
+                futures = [executor.submit(read_slice, index) for index in order]
+
+                for future in as_completed(futures):
+                    future.result()
+                    done += 1
+                    self.report_progress(done, total)
+
+                if phase_callback:
+                    phase_callback(phase, order)
+
+        self.first_slice = None
+        return volume
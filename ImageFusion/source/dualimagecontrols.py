@@ -57,5 +57,4 @@ class DualImageControls:
     def update_dual_view(self):
         for image_view in self.app.image_3_views:
             image_view.opacity = float(self.opacity.get())
-            image_view.update_data()
-            image_view.draw()
+        self.app.render_scheduler.mark_dual(self.app.image_3_views)
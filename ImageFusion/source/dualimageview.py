@@ -2,8 +2,10 @@ import tkinter as tk
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from source.blitmixin import BlitMixIn
+from source.compositor import Compositor
 
-class DualImageView:
+class DualImageView(BlitMixIn):
     
     def __init__(self, app, parent, image_view_1, image_view_2):
         
@@ -19,14 +21,16 @@ class DualImageView:
         self.fig = plt.Figure() # figsize=(3, 3)
         self.ax = self.fig.add_subplot()
         
-        self.image_1 = self.ax.imshow(self.image_view_1.image.get_array(),
-                                      extent=self.image_view_1.get_extent(),
-                                      origin='lower')
-        
-        self.image_2 = self.ax.imshow(self.image_view_2.image.get_array(),
-                                      extent=self.image_view_2.get_extent(),
-                                      alpha=self.opacity,
-                                      origin='lower')
+        # both layers are fused into one RGBA frame, so the canvas draws a single image
+        self.compositor = Compositor()
+        self.base_source = self.base_grid_key = None
+        self.overlay_source = self.overlay_grid_key = None
+        self.overlay_display_state = None
+        self.update_layers()
+        self.image = self.ax.imshow(self.compositor.blend(self.opacity),
+                                    extent=self.compositor.extent,
+                                    interpolation=self.image_view_1.image.get_interpolation(),
+                                    origin='lower')
         
         # Set title and axes
         self.ax.set_title(self.image_view_1.ax.get_title())
@@ -42,28 +46,62 @@ class DualImageView:
         self.canvas.get_tk_widget().bind("<Button-3>", self.enlarge_plot)
         self.canvas.get_tk_widget().focus_set()  # Ensure it can capture key events
         
+        # slice and opacity changes only redraw the fused image over a cached background
+        self.display_state = None
+        self.make_blittable([self.image])
+        
         self.update_data()
     
     def draw(self):
-        self.canvas.draw_idle()
+        self.blit_draw()
         
         if self.enlarged_flag:
             self.enlarged_canvas.draw_idle()
     
+    def update_layers(self):
+        # layers are only resampled when a slice or grid changed and only recolored
+        # when the overlay's window or colormap changed, never for opacity
+        base = self.get_base_rgba()
+        overlay = self.image_view_2.slice
+        base_extent = self.image_view_1.image.get_extent()
+        overlay_extent = self.image_view_2.image.get_extent()
+        
+        self.compositor.set_grid(base_extent, base.shape, overlay_extent, overlay.shape)
+        grid_key = self.compositor.grid_key
+        
+        if base is not self.base_source or grid_key != self.base_grid_key:
+            self.base_source, self.base_grid_key = base, grid_key
+            self.compositor.set_base(base)
+        
+        if overlay is not self.overlay_source or grid_key != self.overlay_grid_key:
+            self.overlay_source, self.overlay_grid_key = overlay, grid_key
+            self.overlay_display_state = None
+            self.compositor.set_overlay(overlay)
+        
+        overlay_display_state = (self.image_view_2.cmap, tuple(self.image_view_2.intensity_limits), self.image_view_2.render_mode)
+        if overlay_display_state != self.overlay_display_state:
+            self.overlay_display_state = overlay_display_state
+            self.compositor.color_overlay(self.image_view_2.colorize)
+    
+    def get_base_rgba(self):
+        # a computed transform is previewed on the displayed plane only
+        preview = self.app.transform_preview
+        if preview.is_active():
+            return preview.get_rgba(self.image_view_1)
+        return self.image_view_1.get_rgba()
+    
     def update_data(self):
         
-        self.image_1.set_data(self.image_view_1.image.get_array())
-        self.image_1.set_cmap(self.image_view_1.image.get_cmap())
-        self.image_1.set_clim(self.image_view_1.image.get_clim())
-        self.image_1.set_interpolation(self.image_view_1.image.get_interpolation())
-        self.image_1.set_extent(self.image_view_1.image.get_extent())
+        self.update_layers()
+        self.image.set_data(self.compositor.blend(self.opacity))
+        self.image.set_interpolation(self.image_view_1.image.get_interpolation())
+        self.image.set_extent(self.compositor.extent)
         
-        self.image_2.set_data(self.image_view_2.image.get_array())
-        self.image_2.set_cmap(self.image_view_2.image.get_cmap())
-        self.image_2.set_clim(self.image_view_2.image.get_clim())
-        self.image_1.set_interpolation(self.image_view_2.image.get_interpolation())
-        self.image_2.set_extent(self.image_view_2.image.get_extent())
-        self.image_2.set_alpha(self.opacity)
+        # axes limits follow the extent and are part of the cached background
+        display_state = tuple(self.compositor.extent)
+        if display_state != self.display_state:
+            self.display_state = display_state
+            self.request_full_draw()
         
         if self.enlarged_flag:
             self.update_enlarged_image()
@@ -72,18 +110,9 @@ class DualImageView:
 
     def update_enlarged_image(self):
         
-        self.enlarged_image_1.set_data(self.image_1.get_array())
-        self.enlarged_image_1.set_cmap(self.image_1.get_cmap())
-        self.enlarged_image_1.set_clim(self.image_1.get_clim())
-        self.enlarged_image_1.set_interpolation(self.image_1.get_interpolation())
-        self.enlarged_image_1.set_extent(self.image_1.get_extent())
-        
-        self.enlarged_image_2.set_data(self.image_2.get_array())
-        self.enlarged_image_2.set_cmap(self.image_2.get_cmap())
-        self.enlarged_image_2.set_clim(self.image_2.get_clim())
-        self.enlarged_image_2.set_interpolation(self.image_2.get_interpolation())
-        self.enlarged_image_2.set_extent(self.image_2.get_extent())        
-        self.enlarged_image_2.set_alpha(self.opacity)
+        self.enlarged_image.set_data(self.image.get_array())
+        self.enlarged_image.set_interpolation(self.image.get_interpolation())
+        self.enlarged_image.set_extent(self.image.get_extent())
  
     def enlarge_plot(self, event=None):
         
@@ -102,12 +131,9 @@ class DualImageView:
             self.enlarged_fig = plt.Figure(dpi=100)
             self.enlarged_ax = self.enlarged_fig.add_subplot()
             
-            self.enlarged_image_1 = self.enlarged_ax.imshow(self.image_1.get_array(),
-                                                            extent=self.image_1.get_extent())
-            
-            self.enlarged_image_2 = self.enlarged_ax.imshow(self.image_2.get_array(),
-                                                            extent=self.image_2.get_extent(),
-                                                            alpha=self.opacity)
+            self.enlarged_image = self.enlarged_ax.imshow(self.image.get_array(),
+                                                          extent=self.image.get_extent(),
+                                                          origin='lower')
             
             # Set title and axes
             self.enlarged_ax.set_title(self.image_view_1.ax.get_title())
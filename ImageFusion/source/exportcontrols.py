@@ -1,7 +1,7 @@
 import tkinter as tk
-import pydicom as dicom
-import numpy as np
+from tkinter import ttk
 from pydicom.uid import generate_uid
+from source.dicomexporter import DicomExporter, TRANSFER_SYNTAXES, get_available_transfer_syntaxes
 
 class ExportControls:
     def __init__(self, app, image_controls, parent_frame, image_data):
@@ -49,7 +49,28 @@ class ExportControls:
         export_DICOM_frame = tk.Frame(parent_frame, bd=1, relief=tk.SUNKEN)
         export_DICOM_frame.pack(side='top', anchor='nw', padx=5, pady=5)
         
+        options = [
+            "Multi-frame",
+            "Series"
+        ]
+        self.export_DICOM_mode = tk.StringVar()
+        self.make_export_dropdown("Format", export_DICOM_frame, options, self.export_DICOM_mode)
+        
+        # lossless compression, limited to the codecs installed locally
+        options = get_available_transfer_syntaxes()
+        self.export_DICOM_compression = tk.StringVar()
+        self.make_export_dropdown("Encoding", export_DICOM_frame, options, self.export_DICOM_compression)
+        
         self.make_button(export_DICOM_frame, "Export DICOM", self.export_DICOM)
+        self.cancel_button = self.make_button(export_DICOM_frame, "Cancel Export", self.cancel_export)
+        self.cancel_button.config(state='disabled')
+        
+        self.export_progress_label = tk.Label(export_DICOM_frame, text='', anchor='w', font=("Arial", 8))
+        self.export_progress_label.pack(side='top', anchor='w', padx=5)
+        self.export_progress_bar = ttk.Progressbar(export_DICOM_frame, orient='horizontal', mode='determinate', maximum=1.0)
+        self.export_progress_bar.pack(side='top', anchor='w', padx=5, pady=2, fill='x')
+        
+        self.exporter = None
         
     def make_export_dropdown(self, name, parent_frame, options, var):
         drop_frame = tk.Frame(parent_frame)
@@ -121,6 +142,9 @@ class ExportControls:
             
     def export_DICOM(self):
         
+        if not self.image_data.loaded or self.exporter is not None:
+            return
+        
         self.image_data.update_dcm_object()
         export_dcm = self.image_data.dcm
         
@@ -132,14 +156,7 @@ class ExportControls:
         # export_dcm.RescaleIntercept = '0.0'
         # export_dcm.RescaleSlope = '1.0'
         
-        # Set Color Window to Full Scale
-        min_val = np.min(self.image_data.X)
-        max_val = np.max(self.image_data.X)
-        export_dcm.WindowCenter = [str((min_val + max_val) / 2)]
-        export_dcm.WindowWidth = [str(max_val - min_val)]
-        export_dcm.VOILUTFunction = "LINEAR"
-        
-        export_dcm.PixelData = self.image_data.X.tobytes()
+        # Color window is set to full scale by the exporter, off the UI thread
         
         export_dcm.BodyPartExamined = "OTHER"
         export_dcm.Modality = "OT"
@@ -151,12 +168,48 @@ class ExportControls:
         export_dcm.StudyInstanceUID = generate_uid()    
         
         # Open file dialog for save location
-        file_path = tk.filedialog.asksaveasfilename(
-            defaultextension = '.dcm',
-            filetypes = [("DICOM Images", '*.dcm')],
-            initialfile = "expoter_image_fusion"
-        )
+        if self.export_DICOM_mode.get() == "Series":
+            mode = 'series'
+            file_path = tk.filedialog.askdirectory(title="Export DICOM series to")
+        else:
+            mode = 'multiframe'
+            file_path = tk.filedialog.asksaveasfilename(
+                defaultextension = '.dcm',
+                filetypes = [("DICOM Images", '*.dcm')],
+                initialfile = "expoter_image_fusion"
+            )
         
         if file_path:  # Ensure user didn't cancel the save dialog
-            export_dcm.save_as(file_path)
-            print(f"DICOM file saved at: {file_path}")
\ No newline at end of file
+            # frames are written from the current (oriented) volume on a worker thread
+            transfer_syntax = TRANSFER_SYNTAXES[self.export_DICOM_compression.get()]
+            self.exporter = DicomExporter(self.image_data.X, export_dcm, file_path, mode=mode, transfer_syntax=transfer_syntax)
+            self.exporter.start()
+            self.cancel_button.config(state='normal')
+            self.app.after(100, self.poll_export)
+    
+    def cancel_export(self):
+        if self.exporter is not None:
+            self.exporter.cancel()
+    
+    def poll_export(self):
+        exporter = self.exporter
+        done, total = exporter.progress
+        self.export_progress_bar['value'] = done / total if total else 0.0
+        
+        if not exporter.finished:
+            self.export_progress_label['text'] = f'Exporting {done}/{total} slices'
+            self.app.after(100, self.poll_export)
+            return
+        
+        if exporter.error:
+            self.export_progress_label['text'] = 'Export failed'
+            print(f"DICOM export failed: {exporter.error}")
+        elif exporter.cancel_event.is_set():
+            self.export_progress_label['text'] = 'Export cancelled'
+            self.export_progress_bar['value'] = 0.0
+        else:
+            self.export_progress_label['text'] = 'Export finished'
+            print(f"DICOM {'series' if exporter.mode == 'series' else 'file'} saved at: {exporter.file_path}")
+        
+        self.cancel_button.config(state='disabled')
+        self.exporter = None
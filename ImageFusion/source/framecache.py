@@ -0,0 +1,74 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class FrameCache:
+
+    # Bounded LRU of rendered frames (slice, RGBA) shared by all image views,
+    # keyed by (volume, volume version, view, slice, colormap, window). Frames
+    # ahead of the scroll direction are rendered on a small worker pool, so
+    # scrolling and back-and-forth scrubbing mostly hit memory.
+
+    def __init__(self, max_bytes=256 * 1024**2, workers=2):
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()
+        self.frames_bytes = 0
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    # --- Cache --- #
+
+    def get(self, key):
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is not None:
+                self.frames.move_to_end(key)
+            return frame
+
+    def put(self, key, frame):
+        # slices can be views of a whole volume; a view would keep that volume alive
+        # after it's replaced and isn't counted by the byte bound, so views are copied
+        frame = tuple(array if array.base is None else np.array(array) for array in frame)
+        frame_bytes = sum(array.nbytes for array in frame)
+        if frame_bytes > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.frames:
+                self.frames.move_to_end(key)
+                return
+            self.frames[key] = frame
+            self.frames_bytes += frame_bytes
+            while self.frames_bytes > self.max_bytes:
+                _, evicted = self.frames.popitem(last=False)
+                self.frames_bytes -= sum(array.nbytes for array in evicted)
+
+    def evict_stale(self, image_data):
+        # frames of an older version of the volume can't be hit again
+        with self.lock:
+            stale = [key for key in self.frames if key[0] == id(image_data) and key[1] != image_data.version]
+            for key in stale:
+                self.frames_bytes -= sum(array.nbytes for array in self.frames.pop(key))
+
+    # --- Prefetch --- #
+
+    def prefetch(self, key, render_frame):
+        # render_frame() runs on a worker and returns the frame, or None if it went stale
+        with self.lock:
+            if key in self.frames or key in self.pending:
+                return
+            self.pending.add(key)
+        self.executor.submit(self.run_prefetch, key, render_frame)
+
+    def run_prefetch(self, key, render_frame):
+        try:
+            frame = render_frame()
+            if frame is not None:
+                self.put(key, frame)
+        except Exception as e:
+            print(f'Frame prefetch failed: {e}')
+        finally:
+            with self.lock:
+                self.pending.discard(key)
@@ -0,0 +1,25 @@
+import numpy as np
+from source.colormaplut import UINT16_LEVELS
+
+def count_intensities(X, max_samples=16 * 1024**2):
+    # occurrences of every uint16 value; volumes larger than max_samples are
+    # sampled every few slices, each slice is counted in place without a copy
+    step = max(1, int(np.ceil(X.size / max_samples)))
+    counts = np.zeros(UINT16_LEVELS, dtype=np.int64)
+    for index in range(0, X.shape[0], step):
+        image_slice = np.asarray(X[index])
+        counts += np.bincount(image_slice.ravel(), minlength=UINT16_LEVELS)
+    return counts
+
+def bin_intensity_counts(counts, bins):
+    # equal-width bins between the lowest and highest occurring value, as np.histogram
+    occurring = np.flatnonzero(counts)
+    low, high = (occurring[0], occurring[-1]) if occurring.size else (0, 1)
+    if high == low:
+        high = low + 1
+
+    edges = np.linspace(low, high, bins + 1)
+    values = np.arange(low, high + 1)
+    indices = np.minimum(((values - low) * bins) // (high - low), bins - 1)
+    binned = np.bincount(indices, weights=counts[low:high + 1], minlength=bins)
+    return binned, edges
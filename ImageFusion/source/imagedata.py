@@ -1,45 +1,108 @@
 import numpy as np
-from tifffile import imread
+from tifffile import imread, TiffFile
 import glob
 import pydicom as dicom
 import os
 import datetime
+import threading
+from collections import OrderedDict
+from source.dicomseries import DicomSeries
+from source.volumecache import VolumeCache
+from source.quantization import quantize_to_uint16, quantize_block, get_slope_intercept
+from source.lazyvolume import LazyVolume
+from source.orientation import Orientation
+from source.pyramid import downsample_volume
+from source.histogram import count_intensities, bin_intensity_counts
+from source.affineresample import affine_resample
 
 class ImageData:
     
-    def __init__(self, file_properties):
+    def __init__(self, file_properties, progress_callback=None, load=True):
         
         self.dcm = None
         self.file_properties = file_properties
+        self.progress_callback = progress_callback
+        self.slope = 1.0
+        self.intercept = 0.0
         
-        # --- Initialize Image --- #
+        # loading state, read by the UI while load() runs on a worker thread
+        self.probed = False
+        self.loaded = False
+        self.load_progress = [0, 0]
+        self.loaded_slices = 0
+        self.load_lock = threading.Lock()
+        self.load_error = None
+        self.slice_reader = None
+        self.stack_axis = 0
+        self.provisional_range = None
+        self.preview_ready = False
         
-        if os.path.isfile(self.file_properties['path']):
-            self.init_file_image()
-        elif os.path.isdir(self.file_properties['path']):
-            self.init_dir_image()
-        else:
+        self.slice_index = [0, 0, 0]
+        self.slice_mm = [0, 0, 0]
+        self.slice_cache = OrderedDict()
+        self.slice_cache_lock = threading.RLock()
+        self.slice_cache_bytes = 0
+        self.max_slice_cache_bytes = self.file_properties.get('slice_cache_size', 256 * 1024**2)
+        self.version = 0
+        self.invalidate_callbacks = [] # called with this ImageData after every version bump
+        
+        # 2x/4x downsampled copies of base_X for small views, built on first request
+        self.pyramid = {}
+        self.pyramid_lock = threading.Lock()
+        self.pyramid_building = False
+        self.max_pyramid_level = 2
+        
+        # value counts of base_X for the intensity histogram, recounted when the version changes
+        self.intensity_counts = None
+        self.intensity_counts_version = None
+        
+        if not os.path.exists(self.file_properties['path']):
             raise RuntimeError("Provided image file path does not exist!")
         
-        # --- Initialize Data Structures --- #
-        
-        # Set Values
-        if not isinstance(self.original_X[0,0,0], np.uint16):
-            necessary_type = np.uint16
-            self.X = self.original_X.copy() - np.min(self.original_X)
-            max_value = np.max(self.X)
-            self.X = (self.X / max_value) * np.iinfo(necessary_type).max
-            self.intercept = np.min(self.original_X) 
-            self.slope = max_value / np.iinfo(necessary_type).max
-            self.X = self.X.astype(necessary_type)
+        self.cache = None
+        if self.file_properties.get('cache_dir'):
+            self.cache = VolumeCache(self.file_properties['cache_dir'],
+                                     self.file_properties.get('cache_size', 10 * 1024**3))
+        
+        if load:
+            self.probe()
+            self.load()
+    
+    # --- Loading --- #
+    
+    def probe(self):
+        # Geometry and (preallocated) volume buffers; slices that aren't read here
+        # are filled in by load(), so the volume can be displayed while it loads
+        cached = self.cache.load(self.file_properties) if self.cache else None
+        
+        if cached:
+            self.init_cached_image(cached)
         else:
-            self.X = self.original_X.copy()
+            if os.path.isfile(self.file_properties['path']):
+                self.init_file_image()
+            else:
+                self.init_dir_image()
+            self.init_source_volume()
+        
+        # Displayed volume is base_X seen through the orientation; base_X is the loaded
+        # volume until an affine transform is applied, then source_X resampled once
+        # through the accumulated transform (base voxel -> source voxel, 4x4)
+        self.base_X = self.source_X
+        self.source_vxl_dims = list(self.vxl_dims)
+        self.base_vxl_dims = list(self.vxl_dims)
+        self.transform = np.eye(4)
+        self.orientation = Orientation()
         
         self.refresh_characteristics()
-        self.max_intensity = np.amax(self.X)
-        self.slice_index = [0, 0, 0]
-        self.slice_mm = [0, 0, 0]
-        self.preload_slices()
+        if self.slice_reader:
+            # provisional until every slice has been read
+            self.max_intensity = np.iinfo(np.uint16).max
+        self.probed = True
+    
+    def load(self):
+        if self.slice_reader:
+            self.slice_reader()
+            self.finalize_source_volume()
         
         # --- Create DICOM stucture --- #
         
@@ -47,7 +110,70 @@ class ImageData:
         if not self.dcm:
             self.create_dcm_object()
         self.update_dcm_object()
-       
+        self.loaded = True
+    
+    def report_progress(self, done, total):
+        self.load_progress = [done, total]
+        if self.progress_callback:
+            self.progress_callback(done, total)
+    
+    def init_source_volume(self):
+        if isinstance(self.original_X, LazyVolume):
+            # quantized on read, nothing to convert or cache
+            self.source_X = self.original_X
+            self.slope, self.intercept = self.source_X.slope, self.source_X.intercept
+            self.slice_reader = None
+        
+        elif self.original_X.dtype == np.uint16:
+            # loaded slices land directly in the displayed volume
+            self.source_X = self.original_X
+        
+        elif self.slice_reader:
+            # slices are quantized against a provisional range as they arrive and
+            # requantized once the full range is known
+            self.source_X = np.zeros(self.original_X.shape, dtype=np.uint16)
+        
+        else:
+            self.source_X, self.slope, self.intercept = quantize_to_uint16(self.original_X)
+        
+        if self.slice_reader is None:
+            self.finalize_source_volume()
+    
+    def on_slice_loaded(self, index):
+        # called from loader threads for each slice written into original_X
+        if self.source_X is not self.original_X:
+            raw_slice = np.moveaxis(self.original_X, self.stack_axis, 0)[index]
+            slice_min, slice_max = raw_slice.min(), raw_slice.max()
+            
+            with self.load_lock:
+                if self.provisional_range is None:
+                    self.provisional_range = [slice_min, slice_max]
+                else:
+                    self.provisional_range = [min(self.provisional_range[0], slice_min),
+                                              max(self.provisional_range[1], slice_max)]
+                min_value, max_value = self.provisional_range
+            
+            quantize_block(raw_slice, min_value, max_value, np.moveaxis(self.source_X, self.stack_axis, 0)[index])
+        
+        with self.load_lock:
+            self.loaded_slices += 1
+    
+    def finalize_source_volume(self):
+        if self.slice_reader and self.source_X is not self.original_X:
+            # every slice has been seen, so the provisional range is the full range
+            quantize_to_uint16(self.original_X, out=self.source_X, min_max=self.provisional_range)
+            self.slope, self.intercept = get_slope_intercept(*self.provisional_range)
+        
+        # the decoded input is not kept once it has been quantized
+        del self.original_X
+        self.max_intensity = np.amax(self.source_X)
+        
+        if self.cache and not isinstance(self.source_X, LazyVolume):
+            self.cache.store(self.file_properties, self.source_X, self.vxl_dims, self.slope, self.intercept,
+                             self.max_intensity, dcm=self.dcm)
+        
+        self.invalidate_slices()
+    
     # --- Image Initialization --- #
     
     def print_info(self):
@@ -57,6 +183,51 @@ class ImageData:
         print(f'Voxel Dims: [{self.vxl_dims[0]}, {self.vxl_dims[1]}, {self.vxl_dims[2]}] mm')
         print('')
     
+    def init_cached_image(self, cached):
+        # decoded and normalized volume, memory-mapped read-only from the cache
+        self.source_X = cached['X']
+        self.vxl_dims = cached['vxl_dims']
+        self.slope = cached['slope']
+        self.intercept = cached['intercept']
+        self.max_intensity = cached['max_intensity'] # stored, so the mapped volume isn't read here
+        self.dcm = cached['dcm']
+    
+    def get_center_out_order(self, indices):
+        indices = list(indices)
+        middle = (indices[0] + indices[-1]) / 2 if indices else 0
+        return sorted(indices, key=lambda index: abs(index - middle))
+    
+    def get_load_phases(self, total):
+        # with a preview step, every Nth slice is read first as a quick look and
+        # the remaining slices follow in a second phase
+        step = self.file_properties.get('preview_step')
+        if not step or step <= 1 or total <= step:
+            return [self.get_center_out_order(range(total))]
+        
+        preview = list(range(0, total, step))
+        remaining = sorted(set(range(total)) - set(preview))
+        return [self.get_center_out_order(preview), self.get_center_out_order(remaining)]
+    
+    def on_phase_loaded(self, phase, indices):
+        if phase == 0 and len(indices) < self.source_X.shape[self.stack_axis]:
+            self.fill_preview(indices)
+    
+    def fill_preview(self, preview_indices):
+        # nearest preview slice stands in for every slice that hasn't been read yet,
+        # the full resolution pass then overwrites them in place
+        stack = np.moveaxis(self.source_X, self.stack_axis, 0)
+        preview = np.sort(np.asarray(preview_indices))
+        indices = np.arange(stack.shape[0])
+        
+        upper = np.clip(np.searchsorted(preview, indices), 0, len(preview) - 1)
+        lower = np.clip(upper - 1, 0, len(preview) - 1)
+        nearest = np.where(np.abs(preview[lower] - indices) <= np.abs(preview[upper] - indices),
+                           preview[lower], preview[upper])
+        
+        missing = np.setdiff1d(indices, preview)
+        stack[missing] = stack[nearest[missing]]
+        self.preview_ready = True
+    
     def init_file_image(self):
         
         def init_dcm_file():
@@ -65,9 +236,44 @@ class ImageData:
             self.vxl_dims = 3*[self.dcm.PixelSpacing[0]]
         
         def init_tif_file():
-            self.original_X = imread(self.file_properties['path'])
-            self.original_X = np.flip(self.original_X, axis=0)
+            if self.file_properties.get('lazy'):
+                try:
+                    # slices are read on demand, the flip is an index mapping
+                    self.original_X = LazyVolume(file_path, flip_axis=0)
+                    self.vxl_dims = 3*[self.file_properties['vxl_dim_size']]
+                    return
+                except RuntimeError as e:
+                    print(f'Lazy loading unavailable, reading full image: {e}')
+            
             self.vxl_dims = 3*[self.file_properties['vxl_dim_size']]
+            
+            with TiffFile(file_path) as tif:
+                series = tif.series[0]
+                shape, dtype, n_pages = series.shape, series.dtype, len(series.pages)
+            
+            if len(shape) == 3 and n_pages == shape[0]:
+                # one page per slice, read page by page into the preallocated stack
+                self.original_X = np.empty(shape, dtype=dtype)
+                self.stack_axis = 0
+                self.slice_reader = read_tif_pages
+            else:
+                self.original_X = imread(self.file_properties['path'])
+                self.original_X = np.flip(self.original_X, axis=0)
+        
+        def read_tif_pages():
+            with TiffFile(file_path) as tif:
+                pages = tif.series[0].pages
+                total = len(pages)
+                done = 0
+                
+                for phase, order in enumerate(self.get_load_phases(total)):
+                    for index in order:
+                        # stack is flipped along the page axis
+                        self.original_X[index] = pages[total - 1 - index].asarray()
+                        self.on_slice_loaded(index)
+                        done += 1
+                        self.report_progress(done, total)
+                    self.on_phase_loaded(phase, order)
         
         file_path = self.file_properties['path']
         
@@ -83,36 +289,54 @@ class ImageData:
     def init_dir_image(self):
         
         def init_dcm_dir():
-            plots = []
-            for idx, file_name in enumerate(files):
-                self.dcm = dicom.dcmread(file_name)
-                pix = self.dcm.pixel_array
-                plots.append(pix)
-                
-            self.original_X = np.stack(plots, axis=self.file_properties['transverse_axis'])
+            series = DicomSeries(files,
+                                 transverse_axis=self.file_properties['transverse_axis'],
+                                 workers=self.file_properties.get('workers'),
+                                 progress_callback=self.report_progress,
+                                 series_uid=self.file_properties.get('series_uid'))
+            
+            series.scan_headers()
+            volume_shape, dtype = series.probe()
+            self.original_X = np.empty(volume_shape, dtype=dtype)
+            self.stack_axis = self.file_properties['transverse_axis']
+            self.slice_reader = lambda: series.read_volume(self.original_X, self.on_slice_loaded,
+                                                           phases=self.get_load_phases(len(series.files)),
+                                                           phase_callback=self.on_phase_loaded)
+            self.dcm = series.dcm
             self.vxl_dims = 3*[self.dcm.PixelSpacing[0]]
             
         def init_tif_dir():
-            plots = []
-            for idx, file_name in enumerate(files):
-                plots.append(imread(file_name))
-
-            self.original_X = np.stack(plots, axis=self.file_properties['transverse_axis'])
+            first_slice = imread(files[0])
+            volume_shape = list(first_slice.shape)
+            volume_shape.insert(self.file_properties['transverse_axis'], len(files))
+            
+            self.original_X = np.empty(volume_shape, dtype=first_slice.dtype)
+            self.stack_axis = self.file_properties['transverse_axis']
+            self.slice_reader = read_tif_dir
             self.vxl_dims = 3*[self.file_properties['vxl_dim_size']]
+        
+        def read_tif_dir():
+            stack = np.moveaxis(self.original_X, self.stack_axis, 0)
+            done = 0
+            
+            for phase, order in enumerate(self.get_load_phases(len(files))):
+                for index in order:
+                    stack[index] = imread(files[index])
+                    self.on_slice_loaded(index)
+                    done += 1
+                    self.report_progress(done, len(files))
+                self.on_phase_loaded(phase, order)
             
-        files = glob.glob(self.file_properties['path'] + '*')
+        files = sorted(glob.glob(self.file_properties['path'] + '*'))
         
         if len(files) > 0:
         
-            if files[0].lower().endswith('.dcm'):
-                init_dcm_dir()
-            
-            elif files[0].lower().endswith('.tif'):
+            if files[0].lower().endswith('.tif'):
                 init_tif_dir()
             
             else:
-                raise RuntimeError("Provided image file(s) does not exist!")
-                print(f"{files[0]}")
+                # DICOM series (.dcm, .IMA, no extension); non-image files are dropped by the header scan
+                init_dcm_dir()
             
         else:
             raise RuntimeError("Provided image file directory is empty!")
@@ -136,7 +360,6 @@ class ImageData:
         
         # Set Image Type
         dcm.ImageType = ["ORIGINAL", "PRIMARY", "AXIAL"]
-        dcm.PixelData = self.X.tobytes()
         dcm.Rows, dcm.Columns = self.X.shape[1], self.X.shape[2]
         dcm.NumberOfFrames = self.X.shape[0]  # Number of slices
         dcm.BitsAllocated = 16
@@ -154,7 +377,7 @@ class ImageData:
         self.dcm = dcm
     
     def update_dcm_object(self):
-        self.dcm.PixelData = self.X.tobytes()
+        # PixelData is only attached by the DicomExporter, the header is kept in sync here
         self.dcm.NumberOfFrames = self.X.shape[0]
         self.dcm.Rows, self.dcm.Columns = self.X.shape[1], self.X.shape[2]
         self.dcm.SliceThickness = str(self.vxl_dims[0])
@@ -162,12 +385,18 @@ class ImageData:
     
     # --- CHARACTERISTICS --- #
     
+    @property
+    def X(self):
+        # O(1) view for in-memory volumes; a contiguous copy is only made by consumers that need one
+        return self.orientation.apply(self.base_X)
+    
     def refresh_characteristics(self):
+        self.vxl_dims = self.orientation.permute(self.base_vxl_dims)
         self.set_vxls_per_view()
         self.set_mm_per_view()
     
     def set_vxls_per_view(self):
-        self.vxls_per_view = [int(self.X.shape[0]), int(self.X.shape[1]), int(self.X.shape[2])]
+        self.vxls_per_view = [int(n) for n in self.orientation.permute(self.base_X.shape)]
     
     def set_mm_per_view(self):
         self.mm_per_view = np.multiply(self.vxl_dims, self.vxls_per_view)
@@ -180,6 +409,14 @@ class ImageData:
     def get_matrix(self):
         return self.X.copy()
     
+    def get_intensity_histogram(self, bins=100):
+        # counted once per volume version on the uint16 values; lazy and large
+        # volumes are sampled every few slices instead of being read in full
+        if self.intensity_counts_version != self.version:
+            self.intensity_counts = count_intensities(self.base_X)
+            self.intensity_counts_version = self.version
+        return bin_intensity_counts(self.intensity_counts, bins)
+    
     # --- SLICE CONTROLS --- #
     
     def get_slice_number_from_mm(self, view, mm):
@@ -200,36 +437,59 @@ class ImageData:
             slice_percent = slice_number / self.vxls_per_view[view]
             return slice_percent * self.mm_per_view[view] - self.mm_per_view[view]/2
         
-    def preload_slices(self):
-        self.preloaded_slices_1 = [self.X[i, :, :] for i in range(self.X.shape[0])]
-        self.preloaded_slices_2 = [self.X[:, i, :] for i in range(self.X.shape[1])]
-        self.preloaded_slices_3 = [self.X[:, :, i] for i in range(self.X.shape[2])]
+    def invalidate_slices(self):
+        # called whenever X changes; slices are computed on demand so there is nothing to rebuild
+        with self.slice_cache_lock:
+            self.version += 1
+            self.slice_cache.clear()
+            self.slice_cache_bytes = 0
+        for callback in self.invalidate_callbacks:
+            callback(self)
+    
+    def get_slice(self, view, slice_number, level=0):
+        version = self.version
+        X = self.get_pyramid_volume(level) if level else None
+        if X is None:
+            X, level = self.base_X, 0
+        if level:
+            # same relative position in the downsampled volume
+            level_count = self.orientation.permute(X.shape)[view]
+            slice_number = min(slice_number * level_count // self.vxls_per_view[view], level_count - 1)
+        image_slice = self.orientation.get_slice(X, view, slice_number)
+        
+        # zero-copy views are returned as is; strided views (coronal, sagittal, flipped axes)
+        # and lazily read slices go through a bounded cache of C-contiguous copies
+        if image_slice.flags.c_contiguous and not isinstance(X, LazyVolume):
+            return image_slice
         
-    def get_slice_from_view(self, view):
+        key = (view, slice_number, level)
+        with self.slice_cache_lock:
+            if key in self.slice_cache:
+                self.slice_cache.move_to_end(key)
+                return self.slice_cache[key]
+        
+        image_slice = np.ascontiguousarray(image_slice)
+        with self.slice_cache_lock:
+            # don't cache a copy taken from a volume that changed meanwhile
+            if self.version == version and image_slice.nbytes <= self.max_slice_cache_bytes:
+                self.slice_cache[key] = image_slice
+                self.slice_cache_bytes += image_slice.nbytes
+                while self.slice_cache_bytes > self.max_slice_cache_bytes:
+                    _, evicted = self.slice_cache.popitem(last=False)
+                    self.slice_cache_bytes -= evicted.nbytes
+        
+        return image_slice
+    
+    def get_slice_from_view(self, view, level=0):
         slice_number = self.slice_index[view]
-        if view == 0:
-            return self.preloaded_slices_1[slice_number]
-        elif view == 1:
-            return self.preloaded_slices_2[slice_number]
-        else: # view == 2:
-            return self.preloaded_slices_3[slice_number]
+        return self.get_slice(view, slice_number, level)
     
     def get_slice_from_mm(self, view, slice_mm):
         slice_number = self.get_slice_number_from_mm(view, slice_mm)
-        if view == 0:
-            return self.preloaded_slices_1[slice_number]
-        elif view == 1:
-            return self.preloaded_slices_2[slice_number]
-        else: # view == 2:
-            return self.preloaded_slices_3[slice_number]
+        return self.get_slice(view, slice_number)
     
     def get_slice_from_slice_number(self, view, slice_number):
-        if view == 0:
-            return self.preloaded_slices_1[slice_number]
-        elif view == 1:
-            return self.preloaded_slices_2[slice_number]
-        else: # view == 2:
-            return self.preloaded_slices_3[slice_number]
+        return self.get_slice(view, slice_number)
     
     def set_slice_from_mm(self, view, slice_mm):
         self.slice_index[view] = self.get_slice_number_from_mm(view, slice_mm)
@@ -239,79 +499,118 @@ class ImageData:
         self.slice_index[view] = slice_number
         self.slice_mm[view] = self.get_mm_from_slice_number(view, slice_number)
         
+    # --- PYRAMID --- #
+    
+    def get_pyramid_volume(self, level):
+        # None until the level is built
+        with self.pyramid_lock:
+            return self.pyramid.get(level)
+    
+    def is_pyramid_ready(self, level):
+        with self.pyramid_lock:
+            return level in self.pyramid
+    
+    def request_pyramid(self):
+        # the pyramid is in base orientation, so flips and rotations keep it valid
+        with self.pyramid_lock:
+            if self.pyramid or self.pyramid_building or not self.loaded:
+                return
+            self.pyramid_building = True
+        threading.Thread(target=self.build_pyramid, args=(self.base_X,), daemon=True).start()
+    
+    def build_pyramid(self, source):
+        levels = {}
+        X = source
+        try:
+            for level in range(1, self.max_pyramid_level + 1):
+                X = downsample_volume(X)
+                levels[level] = X
+        finally:
+            with self.pyramid_lock:
+                self.pyramid_building = False
+                # dropped if the base volume was replaced meanwhile
+                if self.base_X is source:
+                    self.pyramid = levels
+    
+    def clear_pyramid(self):
+        with self.pyramid_lock:
+            self.pyramid = {}
+    
     # --- TRANSFORMS --- #
     
     def invert_view(self, view):
-        self.X = np.flip(self.X, axis=view)
-        self.preload_slices()
+        self.orientation.flip(view)
+        self.invalidate_slices()
         
     def rotate_view(self, view, direction):
         
-        def rotate_slice_indices(x_view, y_view, z_view):
-            
-            # current slice indices
-            slice_0_index = self.slice_index[TRANSVERSE]
-            slice_1_index = self.slice_index[CORONAL]
-            slice_2_index = self.slice_index[SAGITTAL]
-            
-            x_slice_index = self.slice_index[x_view]
-            y_slice_index = self.slice_index[y_view]
-            x = self.get_mm_from_slice_number(x_slice_index, z_view)
-            y = self.get_mm_from_slice_number(y_slice_index, z_view)
-
-            if direction == 'clockwise':
-                t = y
-                y = -x
-                x = t
-            else: # direction == 'anticlockwise':
-                t = y
-                y = x
-                x = -t
-
-            if z_view == 0:
-                # x -> y = sagittal (2)
-                # y -> x = coronal (1)
-                slice_1_index = self.get_slice_number_from_mm(y, SAGITTAL)
-                slice_2_index = self.get_slice_number_from_mm(x, CORONAL)
-                
-            elif z_view == 1:
-                # x -> y = sagittal (2)
-                # y -> x = transverse (0)
-                slice_0_index = self.get_slice_number_from_mm(y, SAGITTAL)
-                slice_2_index = self.get_slice_number_from_mm(x, TRANSVERSE)
-                
-            else: # z_view == 2:
-                # x -> y coronal (1)
-                # y -> x transverse (0)
-                slice_0_index = self.get_slice_number_from_mm(y. CORONAL)
-                slice_1_index = self.get_slice_number_from_mm(x, TRANSVERSE)
-            
-            self.slice_index[0] = slice_0_index
-            self.slice_index[1] = slice_1_index
-            self.slice_index[2] = slice_2_index
-        
-        TRANSVERSE = 0
-        CORONAL = 1
-        SAGITTAL = 2
-        
+        # in-plane axes of each view, rotated with the np.rot90 convention
+        axes = [(1, 2), (0, 2), (0, 1)][view]
+        axis_a, axis_b = axes
         k = 1 if direction == 'clockwise' else 3
         
-        # rearrange slice numbers        
-        if view == 0: # transeverse
-            # x is sagittal (2), y is coronal (1)
-            self.X = np.rot90(self.X, k=k, axes=(1, 2))
-            rotate_slice_indices(SAGITTAL, CORONAL, TRANSVERSE)
+        # keep the crosshair on the same voxel
+        index_a = self.slice_index[axis_a]
+        index_b = self.slice_index[axis_b]
+        if k == 1:
+            self.slice_index[axis_a] = self.vxls_per_view[axis_b] - 1 - index_b
+            self.slice_index[axis_b] = index_a
+        else:
+            self.slice_index[axis_a] = index_b
+            self.slice_index[axis_b] = self.vxls_per_view[axis_a] - 1 - index_a
         
-        elif view == 1: # coronal
-            # x is sagittal (2), y is transverse (0)
-            self.X = np.rot90(self.X, k=k, axes=(0, 2))
-            rotate_slice_indices(SAGITTAL, TRANSVERSE, CORONAL)
-            
-        else: # view == 2: # sagittal
-            # x is coronal (1), y is transverse (0)
-            self.X = np.rot90(self.X, k=k, axes=(0, 1))
-            rotate_slice_indices(CORONAL, TRANSVERSE, SAGITTAL)
-
-        self.set_vxls_per_view()
-        self.set_mm_per_view()
-        self.update_slices()
\ No newline at end of file
+        self.orientation.rotate(k, axes)
+        self.refresh_characteristics()
+        self.invalidate_slices()
+        
+        for axis in axes:
+            self.set_slice_from_slice_number(axis, self.slice_index[axis])
+    
+    def get_transform(self):
+        # displayed voxel -> source voxel, flips and rotations included
+        return self.transform @ self.orientation.get_matrix(self.base_X.shape)
+    
+    def apply_affine(self, matrix, offset):
+        # matrix/offset map displayed voxels to the displayed voxels they are sampled from;
+        # composed onto the accumulated transform, so however many are applied the
+        # source is resampled exactly once and interpolation blur doesn't compound.
+        # The UI runs the three steps itself, resampling on a worker thread
+        self.set_resampled_volume(self.resample_source(self.compose_affine(matrix, offset)))
+    
+    def compose_affine(self, matrix, offset):
+        # snapshot of the transform and grid the resample targets, taken with the orientation
+        affine = np.eye(4)
+        affine[:3, :3] = matrix
+        affine[:3, 3] = offset
+        return {"transform": self.get_transform() @ affine,
+                "shape": tuple(self.vxls_per_view),
+                "vxl_dims": list(self.vxl_dims)}
+    
+    def resample_source(self, resampling):
+        # the only expensive step; reads source_X only, so it can run while views render
+        transform, shape = resampling['transform'], resampling['shape']
+        if np.allclose(transform, np.eye(4)) and shape == self.source_X.shape:
+            resampling['X'] = self.source_X
+        else:
+            resampling['X'] = affine_resample(self.source_X, transform[:3, :3], transform[:3, 3],
+                                              out=np.empty(shape, dtype=self.source_X.dtype))
+        return resampling
+    
+    def set_resampled_volume(self, resampling):
+        # new base, transform and orientation are published together, on the UI thread
+        self.base_X = resampling['X']
+        self.transform = resampling['transform']
+        self.base_vxl_dims = resampling['vxl_dims']
+        self.orientation.reset()
+        self.refresh_characteristics()
+        self.clear_pyramid()
+        self.invalidate_slices()
+    
+    def reset_transforms(self):
+        self.base_X = self.source_X
+        self.transform = np.eye(4)
+        self.base_vxl_dims = list(self.source_vxl_dims)
+        self.orientation.reset()
+        self.refresh_characteristics()
+        self.clear_pyramid()
+        self.invalidate_slices()
@@ -4,9 +4,11 @@ import matplotlib.pyplot as plt
 from matplotlib import rcParams
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from mpl_toolkits.axes_grid1 import make_axes_locatable
+from source.blitmixin import BlitMixIn
+from source.colormaplut import get_colormap_lut, apply_colormap_lut
 rcParams['figure.dpi'] = 100
 
-class ImageView:
+class ImageView(BlitMixIn):
     
     def __init__(self, app, parent_frame, image_data, view):
         
@@ -17,6 +19,24 @@ class ImageView:
         self.interpolation = "None"
         self.enlarged_flag = False
         
+        # 'lut' colors uint16 slices through a precomputed table, 'matplotlib' leaves it to imshow
+        self.render_mode = 'lut'
+        self.lut_key = None
+        self.lut = None
+        self.rgba = None
+        
+        # rendered frames are shared through the app's frame cache; slices ahead of
+        # the scroll direction are rendered in the background
+        self.frame_cache = self.app.frame_cache
+        self.prefetch_depth = 4
+        self.slice_number = 0
+        self.scroll_direction = 0
+        self.frame_key = None
+        
+        # pyramid level shown, picked from the on-screen size of the axes
+        self.display_level = 0
+        self.waiting_for_pyramid = False
+        
         # Initialize Image
         self.image_data = image_data
         self.slice = self.image_data.get_slice_from_slice_number(view, 0)
@@ -53,10 +73,15 @@ class ImageView:
         self.cursor_h = self.ax.axhline(y=[0], visible=True, color='black', alpha=0.5)
         self.cursor_v = self.ax.axvline(x=[0], visible=True, color='black', alpha=0.5)
         
+        # slice and crosshair changes only redraw these artists over a cached background
+        self.display_state = None
+        self.make_blittable([self.image, self.cursor_h, self.cursor_v])
+        
         # Bind right-click event to open enlarged plot
         self.canvas.get_tk_widget().bind("<Button-2>", self.enlarge_plot)
         self.canvas.get_tk_widget().bind("<Button-3>", self.enlarge_plot)
         self.canvas.get_tk_widget().focus_set()  # Ensure it can capture key events  
+        self.canvas.mpl_connect('resize_event', self.on_resize)
     
     # --- View parameters --- #
     
@@ -66,15 +91,15 @@ class ImageView:
 
     def set_intensity(self, intensity_limits):
         self.intensity_limits = [intensity_limits[0]*self.image_data.max_intensity, intensity_limits[1]*self.image_data.max_intensity]
-        self.update_data()
+        self.app.render_scheduler.mark_data([self])
     
     def set_cmap(self, cmap):
         self.cmap = cmap
-        self.update_data()
+        self.app.render_scheduler.mark_data([self])
     
     def set_interpolation(self, interpolation):
         self.interpolation = interpolation
-        self.update_data()
+        self.app.render_scheduler.mark_data([self])
     
     def set_xaxis(self, ax):
         def get_divisors(n):
@@ -153,21 +178,144 @@ class ImageView:
     # --- Drawing --- #
     
     def reload_slice(self):
-        self.slice = self.image_data.get_slice_from_view(self.view)
+        slice_number = self.image_data.slice_index[self.view]
+        if slice_number != self.slice_number:
+            self.scroll_direction = int(np.sign(slice_number - self.slice_number))
+        self.slice_number = slice_number
+        
+        self.display_level = self.get_display_level()
+        
+        frame = self.frame_cache.get(self.get_frame_key(slice_number))
+        if frame is not None:
+            self.slice, self.rgba = frame
+            self.frame_key = self.get_frame_key(slice_number)
+        else:
+            self.slice = self.image_data.get_slice_from_view(self.view, self.display_level)
+            self.frame_key = None
     
     def update_data(self):        
         self.image.set_interpolation(self.interpolation)
         self.image.set_cmap(self.cmap)
-        self.image.set_data(np.clip(self.slice, self.intensity_limits[0], self.intensity_limits[1]))
+        self.set_image_data()
         self.image.set_clim(vmin=self.intensity_limits[0], vmax=self.intensity_limits[1])
         self.cbar.update_normal(self.image) 
         self.image.set_extent(self.get_extent())
         
+        # colorbar and axes limits are part of the cached background
+        display_state = (self.cmap, tuple(self.intensity_limits), tuple(self.get_extent()))
+        if display_state != self.display_state:
+            self.display_state = display_state
+            self.request_full_draw()
+        
         if self.enlarged_flag:
             self.update_enlarged_image()
     
+    def set_image_data(self):
+        if self.render_mode == 'lut' and self.slice.dtype == np.uint16:
+            # RGBA by one table lookup; the table is only rebuilt when the window or colormap changes
+            lut_key = (self.cmap, float(self.intensity_limits[0]), float(self.intensity_limits[1]))
+            if lut_key != self.lut_key:
+                self.lut_key = lut_key
+                self.lut = get_colormap_lut(*lut_key)
+            
+            frame_key = self.get_frame_key(self.slice_number)
+            if frame_key != self.frame_key:
+                self.rgba = apply_colormap_lut(self.slice, self.lut)
+                self.frame_key = frame_key
+                self.frame_cache.put(frame_key, (self.slice, self.rgba))
+            self.image.set_data(self.rgba)
+            self.prefetch_frames()
+        else:
+            self.rgba = None
+            self.frame_key = None
+            self.image.set_data(np.clip(self.slice, self.intensity_limits[0], self.intensity_limits[1]))
+    
+    # --- Frame Cache --- #
+    
+    def get_frame_key(self, slice_number):
+        return (id(self.image_data), self.image_data.version, self.view, slice_number, self.display_level,
+                self.cmap, float(self.intensity_limits[0]), float(self.intensity_limits[1]))
+    
+    def prefetch_frames(self):
+        
+        def render_frame(slice_number, key, lut):
+            # skipped once the volume changed or the scroll moved on
+            if self.image_data.version != key[1] or abs(slice_number - self.slice_number) > self.prefetch_depth:
+                return None
+            image_slice = self.image_data.get_slice(self.view, slice_number, key[4])
+            if self.image_data.version != key[1]:
+                return None
+            return image_slice, apply_colormap_lut(image_slice, lut)
+        
+        if not self.scroll_direction or self.image_data.slice_reader and not self.image_data.loaded:
+            return
+        
+        for step in range(1, self.prefetch_depth + 1):
+            slice_number = self.slice_number + step * self.scroll_direction
+            if not 0 <= slice_number < self.image_data.vxls_per_view[self.view]:
+                break
+            key = self.get_frame_key(slice_number)
+            self.frame_cache.prefetch(key, lambda slice_number=slice_number, key=key, lut=self.lut: render_frame(slice_number, key, lut))
+    
+    # --- Resolution --- #
+    
+    def is_zoomed(self):
+        extent = self.get_extent()
+        x_low, x_high = sorted(self.ax.get_xlim())
+        y_low, y_high = sorted(self.ax.get_ylim())
+        return x_high - x_low < 0.99 * (extent[1] - extent[0]) or y_high - y_low < 0.99 * (extent[3] - extent[2])
+    
+    def get_display_level(self):
+        # coarsest pyramid level that still has a voxel per screen pixel; full
+        # resolution in the enlarged plot and when zoomed in
+        if self.enlarged_flag or self.is_zoomed():
+            return 0
+        
+        x_dim, y_dim = [2, 2, 1][self.view], [1, 0, 0][self.view]
+        width, height = self.ax.bbox.width, self.ax.bbox.height
+        if width < 1 or height < 1:
+            return 0
+        ratio = min(self.image_data.vxls_per_view[x_dim] / width, self.image_data.vxls_per_view[y_dim] / height)
+        level = min(int(np.log2(max(ratio, 1.0))), self.image_data.max_pyramid_level)
+        
+        if level and not self.image_data.is_pyramid_ready(level):
+            # full resolution until the pyramid is built in the background
+            self.image_data.request_pyramid()
+            self.wait_for_pyramid()
+            return 0
+        return level
+    
+    def wait_for_pyramid(self):
+        
+        def check_pyramid():
+            if self.image_data.pyramid_building:
+                self.app.after(250, check_pyramid)
+            else:
+                self.waiting_for_pyramid = False
+                self.app.render_scheduler.mark_reload([self])
+        
+        if self.image_data.pyramid_building and not self.waiting_for_pyramid:
+            self.waiting_for_pyramid = True
+            self.app.after(250, check_pyramid)
+    
+    def on_resize(self, event):
+        if self.get_display_level() != self.display_level:
+            self.app.render_scheduler.mark_reload([self])
+    
+    def colorize(self, values):
+        # colors values (e.g. a resampled slice) with this view's colormap and window
+        if self.render_mode == 'lut' and values.dtype == np.uint16:
+            return apply_colormap_lut(values, get_colormap_lut(self.cmap, float(self.intensity_limits[0]), float(self.intensity_limits[1])))
+        return self.image.to_rgba(np.clip(values, self.intensity_limits[0], self.intensity_limits[1]), bytes=True)
+    
+    def get_rgba(self):
+        # colored slice (uint8 RGBA); the same array is returned until the slice or display changes
+        if self.rgba is None:
+            self.rgba = self.image.to_rgba(self.image.get_array(), bytes=True)
+        return self.rgba
+    
     def draw(self):
-        self.canvas.draw_idle()
+        self.blit_draw()
         
         if self.enlarged_flag:
             self.enlarged_canvas.draw_idle()
@@ -198,6 +346,7 @@ class ImageView:
         def close_enlarged( popup):
             self.enlarged_flag = False
             popup.destroy()
+            self.app.render_scheduler.mark_reload([self])
         
         if not self.enlarged_flag:
             self.enlarged_flag = True
@@ -236,5 +385,6 @@ class ImageView:
             self.enlarged_cursor_h = self.enlarged_ax.axhline(y=self.cursor_h.get_ydata())
             self.enlarged_cursor_v = self.enlarged_ax.axvline(x=self.cursor_v.get_xdata())
             
-            # Sync data
-            self.update_enlarged_image()
\ No newline at end of file
+            # Sync data, at full resolution
+            self.update_enlarged_image()
+            self.app.render_scheduler.mark_reload([self])
\ No newline at end of file
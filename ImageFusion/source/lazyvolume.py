@@ -0,0 +1,139 @@
+import numpy as np
+import tifffile
+from source.quantization import get_min_max, get_slope_intercept, quantize_block
+
+try:
+    import zarr
+except ImportError:
+    zarr = None
+
+class LazyVolume:
+
+    # Read-only uint16 view of a TIFF stack that stays on disk. Slices are read
+    # and quantized on demand; the full array is only built by __array__.
+
+    ndim = 3
+    dtype = np.dtype(np.uint16)
+
+    def __init__(self, path, flip_axis=None):
+
+        self.path = path
+        self.flip_axis = flip_axis
+        self.materialized = None
+        self.source = self.open_source()
+        self.shape = tuple(self.source.shape)
+
+        if self.source.ndim != 3:
+            raise RuntimeError(f"Lazy loading requires a 3D image stack, got shape {self.shape}!")
+
+        # one streaming pass for the quantization range
+        self.min_value, self.max_value = get_min_max(self.source)
+        self.quantize = self.source.dtype != np.uint16
+        if self.quantize:
+            self.slope, self.intercept = get_slope_intercept(self.min_value, self.max_value)
+        else:
+            self.slope, self.intercept = 1.0, 0.0
+
+    def open_source(self):
+        try:
+            return tifffile.memmap(self.path, mode='r')
+        except ValueError:
+            pass # compressed or non-contiguous pages can't be memory-mapped
+
+        if zarr is None:
+            raise RuntimeError("TIFF is not memory-mappable and zarr is not installed for lazy loading!")
+
+        source = zarr.open(tifffile.imread(self.path, aszarr=True), mode='r')
+        if not hasattr(source, 'shape'): # multiscale group, full resolution level
+            source = source[0]
+        return source
+
+    # --- Array Interface --- #
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def get_source_key(self, key):
+        # map an index into the flipped volume onto the stored one
+        if not isinstance(key, tuple):
+            key = (key,)
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        source_key = []
+        flip_result_axes = []
+        result_axis = 0
+        for axis, index in enumerate(key):
+            n = self.shape[axis]
+            if isinstance(index, (int, np.integer)):
+                index = int(index) + n if index < 0 else int(index)
+                source_key.append(n - 1 - index if axis == self.flip_axis else index)
+                continue
+            if not isinstance(index, slice) or index.step not in (None, 1):
+                return None
+            start, stop, _ = index.indices(n)
+            if axis == self.flip_axis:
+                source_key.append(slice(n - stop, n - start))
+                flip_result_axes.append(result_axis)
+            else:
+                source_key.append(slice(start, stop))
+            result_axis += 1
+
+        return tuple(source_key), flip_result_axes
+
+    def __getitem__(self, key):
+        if self.materialized is not None:
+            return self.materialized[key]
+
+        mapped = self.get_source_key(key)
+        if mapped is None:
+            return np.asarray(self)[key]
+
+        source_key, flip_result_axes = mapped
+        block = np.asarray(self.source[source_key])
+        if self.quantize:
+            block = quantize_block(block, self.min_value, self.max_value, np.empty(block.shape, dtype=np.uint16))
+
+        for axis in flip_result_axes:
+            block = np.flip(block, axis=axis)
+        return block
+
+    def __array__(self, dtype=None, copy=None):
+        X = self.materialize()
+        return X if dtype is None else X.astype(dtype)
+
+    def materialize(self):
+        if self.materialized is None:
+            X = np.empty(self.shape, dtype=np.uint16)
+            slab_size = max(1, (64 * 1024**2) // max(1, int(np.prod(self.shape[1:])) * 8))
+
+            for start in range(0, self.shape[0], slab_size):
+                stop = min(start + slab_size, self.shape[0])
+                block = np.asarray(self.source[start:stop])
+                if self.quantize:
+                    quantize_block(block, self.min_value, self.max_value, X[start:stop])
+                else:
+                    X[start:stop] = block
+
+            self.materialized = X if self.flip_axis is None else np.flip(X, axis=self.flip_axis)
+        return self.materialized
+
+    def copy(self):
+        return self.materialize().copy()
+
+    def min(self, axis=None, out=None, **kwargs):
+        if axis is None and out is None:
+            return np.uint16(0) if self.quantize else self.dtype.type(self.min_value)
+        return np.asarray(self).min(axis=axis, out=out, **kwargs)
+
+    def max(self, axis=None, out=None, **kwargs):
+        if axis is None and out is None:
+            return np.uint16(np.iinfo(np.uint16).max) if self.quantize else self.dtype.type(self.max_value)
+        return np.asarray(self).max(axis=axis, out=out, **kwargs)
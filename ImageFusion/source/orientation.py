@@ -0,0 +1,82 @@
+import numpy as np
+
+class Orientation:
+
+    # Display orientation of a volume as an axis permutation plus per-axis flips,
+    # displayed = flip(transpose(X, perm), flips). Flips and rotations only
+    # update this state; the volume itself is never copied.
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.perm = [0, 1, 2]
+        self.flips = [False, False, False]
+
+    def is_identity(self):
+        return self.perm == [0, 1, 2] and not any(self.flips)
+
+    # --- Composition --- #
+
+    def flip(self, axis):
+        self.flips[axis] = not self.flips[axis]
+
+    def swap(self, axis_a, axis_b):
+        self.perm[axis_a], self.perm[axis_b] = self.perm[axis_b], self.perm[axis_a]
+        self.flips[axis_a], self.flips[axis_b] = self.flips[axis_b], self.flips[axis_a]
+
+    def rotate(self, k, axes):
+        # same convention as np.rot90(X, k, axes)
+        axis_a, axis_b = axes
+        k = k % 4
+
+        if k == 1:
+            self.flip(axis_b)
+            self.swap(axis_a, axis_b)
+        elif k == 2:
+            self.flip(axis_a)
+            self.flip(axis_b)
+        elif k == 3:
+            self.swap(axis_a, axis_b)
+            self.flip(axis_b)
+
+    # --- Evaluation --- #
+
+    def get_matrix(self, shape):
+        # 4x4 index map from a displayed voxel to the stored voxel of a volume of this (stored) shape
+        matrix = np.eye(4)
+        matrix[:3, :3] = 0
+        for view, axis in enumerate(self.perm):
+            if self.flips[view]:
+                matrix[axis, view] = -1
+                matrix[axis, 3] = shape[axis] - 1
+            else:
+                matrix[axis, view] = 1
+        return matrix
+
+    def permute(self, values):
+        return [values[axis] for axis in self.perm]
+
+    def apply(self, X):
+        if self.is_identity():
+            return X
+        X = np.transpose(X, self.perm)
+        return X[tuple(slice(None, None, -1) if flip else slice(None) for flip in self.flips)]
+
+    def get_slice(self, X, view, slice_number):
+        # index the stored volume directly so only one plane is touched
+        axis = self.perm[view]
+        if self.flips[view]:
+            slice_number = X.shape[axis] - 1 - slice_number
+
+        index = [slice(None)] * 3
+        index[axis] = slice_number
+        image_slice = X[tuple(index)]
+
+        # remaining displayed axes, in display order, and their stored axes
+        views = [v for v in range(3) if v != view]
+        axes = [self.perm[v] for v in views]
+        if axes[0] > axes[1]:
+            image_slice = image_slice.T
+
+        return image_slice[tuple(slice(None, None, -1) if self.flips[v] else slice(None) for v in views)]
@@ -0,0 +1,18 @@
+import numpy as np
+
+def downsample_volume(X, slab_bytes=64 * 1024**2):
+    # 2x2x2 block mean (axes shorter than 2 are kept), read a slab at a time so
+    # lazy volumes never have to be materialized; odd trailing voxels are dropped
+    factors = [2 if n >= 2 else 1 for n in X.shape]
+    shape = [n // factor for n, factor in zip(X.shape, factors)]
+    X_out = np.empty(shape, dtype=X.dtype)
+
+    slab_size = max(1, slab_bytes // max(1, int(np.prod(X.shape[1:])) * X.dtype.itemsize * factors[0]))
+    for start in range(0, shape[0], slab_size):
+        stop = min(start + slab_size, shape[0])
+        slab = np.asarray(X[start * factors[0]:stop * factors[0], :shape[1] * factors[1], :shape[2] * factors[2]])
+        blocks = slab.reshape(stop - start, factors[0], shape[1], factors[1], shape[2], factors[2])
+        mean = blocks.mean(axis=(1, 3, 5), dtype=np.float32)
+        X_out[start:stop] = np.rint(mean) if np.issubdtype(X.dtype, np.integer) else mean
+
+    return X_out
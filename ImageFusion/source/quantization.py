@@ -0,0 +1,50 @@
+import numpy as np
+
+UINT16_MAX = np.iinfo(np.uint16).max
+
+def get_min_max(X, slab_bytes=64 * 1024**2):
+    # extrema of both ends in one pass over the volume, a slab at a time
+    slab_size = max(1, slab_bytes // max(1, X[0].nbytes))
+    min_value, max_value = None, None
+
+    for start in range(0, X.shape[0], slab_size):
+        slab = np.asarray(X[start:start + slab_size])
+        slab_min, slab_max = slab.min(), slab.max()
+        min_value = slab_min if min_value is None else min(min_value, slab_min)
+        max_value = slab_max if max_value is None else max(max_value, slab_max)
+
+    return min_value, max_value
+
+def get_slope_intercept(min_value, max_value):
+    value_range = float(max_value) - float(min_value)
+    slope = value_range / UINT16_MAX if value_range > 0 else 1.0
+    return slope, min_value
+
+def quantize_block(block, min_value, max_value, out, buffer=None):
+    # rescale one block into out (uint16), reusing buffer (float64) when given
+    if buffer is None:
+        buffer = np.empty(block.shape, dtype=np.float64)
+    value_range = float(max_value) - float(min_value)
+
+    np.subtract(block, min_value, out=buffer, dtype=np.float64)
+    if value_range > 0:
+        buffer /= value_range
+        buffer *= UINT16_MAX
+    out[...] = buffer
+    return out
+
+def quantize_to_uint16(X, slab_bytes=64 * 1024**2, out=None, min_max=None):
+    # rescale to the full uint16 range through one reused float64 slab buffer,
+    # so peak memory stays near the input plus the uint16 output
+    min_value, max_value = min_max if min_max else get_min_max(X, slab_bytes)
+
+    X_out = out if out is not None else np.empty(X.shape, dtype=np.uint16)
+    slab_size = max(1, slab_bytes // max(1, X[0].size * 8))
+    buffer = np.empty((min(slab_size, X.shape[0]),) + X.shape[1:], dtype=np.float64)
+
+    for start in range(0, X.shape[0], slab_size):
+        stop = min(start + slab_size, X.shape[0])
+        quantize_block(X[start:stop], min_value, max_value, X_out[start:stop], buffer[:stop - start])
+
+    slope, intercept = get_slope_intercept(min_value, max_value)
+    return X_out, slope, intercept
@@ -0,0 +1,290 @@
+import threading
+import numpy as np
+from numba import njit, prange
+from scipy.optimize import minimize
+from source.pyramid import downsample_volume
+
+class RegistrationCancelled(Exception):
+    pass
+
+@njit(parallel=True, cache=True)
+def sample_moving(M, points, matrix, offset, values, gradients, valid):
+    # trilinear value and gradient (per voxel step) of M at matrix @ point + offset
+    n0, n1, n2 = M.shape
+    for i in prange(points.shape[0]):
+        j0 = matrix[0, 0] * points[i, 0] + matrix[0, 1] * points[i, 1] + matrix[0, 2] * points[i, 2] + offset[0]
+        j1 = matrix[1, 0] * points[i, 0] + matrix[1, 1] * points[i, 1] + matrix[1, 2] * points[i, 2] + offset[1]
+        j2 = matrix[2, 0] * points[i, 0] + matrix[2, 1] * points[i, 1] + matrix[2, 2] * points[i, 2] + offset[2]
+        if j0 < 0 or j1 < 0 or j2 < 0 or j0 > n0 - 1 or j1 > n1 - 1 or j2 > n2 - 1:
+            valid[i] = False
+            continue
+        valid[i] = True
+
+        a0 = min(int(j0), n0 - 1)
+        a1 = min(int(j1), n1 - 1)
+        a2 = min(int(j2), n2 - 1)
+        b0 = min(a0 + 1, n0 - 1)
+        b1 = min(a1 + 1, n1 - 1)
+        b2 = min(a2 + 1, n2 - 1)
+        w0 = j0 - a0
+        w1 = j1 - a1
+        w2 = j2 - a2
+
+        # corners as floats, so differences of unsigned values don't wrap
+        m000, m001, m010, m011 = float(M[a0, a1, a2]), float(M[a0, a1, b2]), float(M[a0, b1, a2]), float(M[a0, b1, b2])
+        m100, m101, m110, m111 = float(M[b0, a1, a2]), float(M[b0, a1, b2]), float(M[b0, b1, a2]), float(M[b0, b1, b2])
+
+        c00 = m000 * (1 - w2) + m001 * w2
+        c01 = m010 * (1 - w2) + m011 * w2
+        c10 = m100 * (1 - w2) + m101 * w2
+        c11 = m110 * (1 - w2) + m111 * w2
+        c0 = c00 * (1 - w1) + c01 * w1
+        c1 = c10 * (1 - w1) + c11 * w1
+
+        d0 = (m001 - m000) * (1 - w1) + (m011 - m010) * w1
+        d1 = (m101 - m100) * (1 - w1) + (m111 - m110) * w1
+
+        values[i] = c0 * (1 - w0) + c1 * w0
+        gradients[i, 0] = c1 - c0
+        gradients[i, 1] = (c01 - c00) * (1 - w0) + (c11 - c10) * w0
+        gradients[i, 2] = d0 * (1 - w0) + d1 * w0
+
+def bspline3(x):
+    x = np.abs(x)
+    return np.where(x < 1, 2 / 3 - x**2 + x**3 / 2, np.where(x < 2, (2 - x)**3 / 6, 0.0))
+
+def bspline3_derivative(x):
+    ax = np.abs(x)
+    return np.where(ax < 1, -2 * x + 1.5 * x * ax, np.where(ax < 2, -0.5 * (2 - ax)**2 * np.sign(x), 0.0))
+
+def get_rotation(angles):
+    # rotations about voxel axes 0, 1 and 2, applied in that order
+    matrix = np.eye(3)
+    for axis, angle in enumerate(angles):
+        a, b = [(1, 2), (0, 2), (0, 1)][axis]
+        rotation = np.eye(3)
+        rotation[a, a] = rotation[b, b] = np.cos(angle)
+        rotation[a, b], rotation[b, a] = -np.sin(angle), np.sin(angle)
+        matrix = rotation @ matrix
+    return matrix
+
+class MutualInformationRegistration:
+
+    # Rigid or affine registration of a moving volume (CT) onto a fixed one (PET)
+    # by maximizing Mattes mutual information, on a worker thread. Both volumes
+    # are centered on the origin in mm like the views. Each pyramid level (4x, 2x,
+    # full) draws random fixed voxels, samples the moving volume through the
+    # transform (numba) and builds the joint histogram with cubic B-spline Parzen
+    # windows (np.bincount); L-BFGS-B uses the analytic gradient. Only the random
+    # samples are kept per level. progress, error and finished are polled by the UI.
+
+    def __init__(self, fixed, fixed_vxl_dims, moving, moving_vxl_dims, mode='rigid',
+                 levels=3, samples=50000, bins=32, iterations=100, seed=0):
+
+        self.fixed = fixed
+        self.fixed_vxl_dims = np.asarray(fixed_vxl_dims, dtype=np.float64)
+        self.moving = moving
+        self.moving_vxl_dims = np.asarray(moving_vxl_dims, dtype=np.float64)
+        self.mode = mode
+        self.levels = levels
+        self.samples = samples
+        self.bins = bins
+        self.iterations = iterations
+        self.rng = np.random.default_rng(seed)
+
+        # q = L @ p + t maps a fixed position (mm) to the moving position shown there
+        self.linear = np.eye(3)
+        self.translation = np.zeros(3)
+        self.angles = np.zeros(3)
+        self.parameterization = 'rigid'
+        self.metric = None
+
+        self.progress = [0, len(self.get_stages()) * iterations]
+        self.progress_lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.error = None
+        self.finished = False
+        self.thread = None
+
+    # --- Control --- #
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise RegistrationCancelled()
+
+    def run(self):
+        try:
+            self.register()
+        except RegistrationCancelled:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+
+    # --- Parameters --- #
+
+    def get_parameters(self):
+        # rotations (or linear terms) are scaled by the fixed radius so a unit step
+        # moves the volume's edge about as far as a unit translation
+        if self.parameterization == 'rigid':
+            return np.concatenate([self.angles * self.radius, self.translation])
+        return np.concatenate([(self.linear - np.eye(3)).ravel() * self.radius, self.translation])
+
+    def set_parameters(self, x):
+        self.translation = x[-3:].copy()
+        if self.parameterization == 'rigid':
+            self.angles = x[:3] / self.radius
+            self.linear = get_rotation(self.angles)
+        else:
+            self.linear = np.eye(3) + x[:9].reshape(3, 3) / self.radius
+
+    def get_parameter_gradient(self, gradient_linear, gradient_translation):
+        if self.parameterization != 'rigid':
+            return np.concatenate([gradient_linear.ravel() / self.radius, gradient_translation])
+
+        # rotation derivatives by central differences, 3x3 matrices only
+        gradient_angles = np.empty(3)
+        for axis in range(3):
+            step = np.zeros(3)
+            step[axis] = 1e-6
+            derivative = (get_rotation(self.angles + step) - get_rotation(self.angles - step)) / 2e-6
+            gradient_angles[axis] = np.sum(gradient_linear * derivative)
+        return np.concatenate([gradient_angles / self.radius, gradient_translation])
+
+    # --- Metric --- #
+
+    def prepare_level(self, fixed, moving, shrink):
+        fixed_vxl_dims = self.fixed_vxl_dims * shrink
+        self.moving_level = np.ascontiguousarray(moving)
+        self.moving_level_vxl_dims = self.moving_vxl_dims * shrink
+
+        # random fixed voxels and their positions, centered like the views
+        n_samples = min(self.samples, fixed.size)
+        flat = self.rng.choice(fixed.size, size=n_samples, replace=False)
+        indices = np.stack(np.unravel_index(flat, fixed.shape), axis=1)
+        self.points = (indices + 0.5) * fixed_vxl_dims - self.fixed_half_extent
+
+        fixed_values = np.asarray(fixed)[tuple(indices.T)].astype(np.float64)
+        fixed_scale = self.bins / max(self.fixed_range[1] - self.fixed_range[0], 1e-12)
+        self.fixed_bins = np.clip(((fixed_values - self.fixed_range[0]) * fixed_scale).astype(np.intp), 0, self.bins - 1)
+
+        # moving values fall between bins 2 and bins - 3, so all four B-spline bins exist
+        self.moving_scale = (self.bins - 5) / max(self.moving_range[1] - self.moving_range[0], 1e-12)
+
+        self.values = np.empty(n_samples, dtype=np.float64)
+        self.gradients = np.empty((n_samples, 3), dtype=np.float64)
+        self.valid = np.empty(n_samples, dtype=np.bool_)
+
+    def evaluate(self, x):
+        # negative mutual information and its gradient, for the minimizer
+        self.check_cancelled()
+        self.set_parameters(x)
+
+        vxl_dims = self.moving_level_vxl_dims
+        matrix = self.linear / vxl_dims[:, None]
+        offset = (self.translation + self.moving_half_extent) / vxl_dims - 0.5
+        sample_moving(self.moving_level, self.points, matrix, offset, self.values, self.gradients, self.valid)
+
+        valid = self.valid
+        n_valid = np.count_nonzero(valid)
+        if n_valid < 16:
+            # no overlap left
+            self.metric = 0.0
+            return 0.0, np.zeros_like(x)
+
+        fixed_bins = self.fixed_bins[valid]
+        position = (self.values[valid] - self.moving_range[0]) * self.moving_scale + 2
+        first = np.floor(position).astype(np.intp) - 1
+
+        # joint histogram: each sample spreads over four moving bins
+        joint = np.zeros(self.bins * self.bins)
+        for step in range(4):
+            weights = bspline3(first + step - position)
+            joint += np.bincount(fixed_bins * self.bins + first + step, weights=weights, minlength=joint.size)
+        joint = joint.reshape(self.bins, self.bins) / n_valid
+
+        fixed_marginal = joint.sum(axis=1)
+        moving_marginal = joint.sum(axis=0)
+        nonzero = joint > 0
+        outer = np.outer(fixed_marginal, moving_marginal)
+        metric = np.sum(joint[nonzero] * np.log(joint[nonzero] / outer[nonzero]))
+
+        # dMI/dp = sum of dP(f, m)/dp * log(P(f, m) / P(m)) (Mattes et al.)
+        log_ratio = np.zeros_like(joint)
+        log_ratio[nonzero] = np.log(joint[nonzero] / np.broadcast_to(moving_marginal, joint.shape)[nonzero])
+
+        sample_derivative = np.zeros(n_valid)
+        for step in range(4):
+            sample_derivative -= bspline3_derivative(first + step - position) * log_ratio[fixed_bins, first + step]
+        sample_derivative *= self.moving_scale / n_valid
+
+        # voxel gradient -> mm, then onto L and t (j = L p / vxl + ...)
+        voxel_derivative = sample_derivative[:, None] * self.gradients[valid] / vxl_dims
+        gradient_linear = voxel_derivative.T @ self.points[valid]
+        gradient_translation = voxel_derivative.sum(axis=0)
+
+        self.metric = metric
+        return -metric, -self.get_parameter_gradient(gradient_linear, gradient_translation)
+
+    # --- Optimization --- #
+
+    def get_pyramid(self, X):
+        # coarsest level first
+        levels = [X]
+        for _ in range(self.levels - 1):
+            levels.append(downsample_volume(levels[-1]))
+        return levels[::-1]
+
+    def get_stages(self):
+        # (pyramid level, parameterization); affine registrations are rigid through the
+        # pyramid first, so the extra degrees of freedom start from a good alignment
+        stages = [(level, 'rigid') for level in range(self.levels)]
+        if self.mode == 'affine':
+            stages.append((self.levels - 1, 'affine'))
+        return stages
+
+    def register(self):
+        fixed = np.asarray(self.fixed)
+        moving = np.asarray(self.moving)
+        self.fixed_half_extent = np.array(fixed.shape) * self.fixed_vxl_dims / 2
+        self.moving_half_extent = np.array(moving.shape) * self.moving_vxl_dims / 2
+        self.radius = float(np.linalg.norm(self.fixed_half_extent))
+
+        self.fixed_range = (float(fixed.min()), float(fixed.max()))
+        self.moving_range = (float(moving.min()), float(moving.max()))
+
+        fixed_pyramid, moving_pyramid = self.get_pyramid(fixed), self.get_pyramid(moving)
+        prepared_level = None
+        for stage, (level, parameterization) in enumerate(self.get_stages()):
+            self.check_cancelled()
+            if level != prepared_level:
+                self.prepare_level(fixed_pyramid[level], moving_pyramid[level], 2 ** (self.levels - 1 - level))
+                prepared_level = level
+            self.parameterization = parameterization
+
+            def on_iteration(x):
+                with self.progress_lock:
+                    self.progress[0] = min(self.progress[0] + 1, (stage + 1) * self.iterations)
+
+            result = minimize(self.evaluate, self.get_parameters(), jac=True, method='L-BFGS-B',
+                              callback=on_iteration, options={'maxiter': self.iterations})
+            self.set_parameters(result.x)
+            with self.progress_lock:
+                self.progress[0] = (stage + 1) * self.iterations
+
+    def get_affine_matrix(self):
+        # same convention as compute_transform: moving (CT) mm from the first voxel's
+        # corner to fixed (PET) mm, inverted and scaled to voxels by apply_transform
+        corner = self.moving_half_extent - 0.5 * self.moving_vxl_dims
+        inverse = np.eye(4)
+        inverse[:3, :3] = self.linear
+        inverse[:3, 3] = self.translation + corner - self.linear @ corner
+        return np.linalg.inv(inverse)
@@ -0,0 +1,82 @@
+class RenderScheduler:
+
+    # Collects which views are out of date and renders them once per Tk idle
+    # cycle, so a burst of events (slider drags, linked panels, clicks that move
+    # two slices) costs a single render. Slices are only fetched at render time,
+    # which drops the intermediate slices of a fast scroll.
+
+    def __init__(self, app):
+        self.app = app
+        self.render_pending = False
+        self.reload_views = set()
+        self.data_views = set()
+        self.dual_views = set()
+        self.crosshair_controls = set()
+        self.draw_views = set()
+
+    def schedule(self):
+        if not self.render_pending:
+            self.render_pending = True
+            self.app.after_idle(self.render)
+
+    # --- Marking --- #
+
+    def mark_draw(self, views):
+        self.draw_views.update(views)
+        self.schedule()
+
+    def mark_data(self, views):
+        self.data_views.update(views)
+        self.mark_draw(views)
+
+    def mark_reload(self, views):
+        self.reload_views.update(views)
+        self.mark_data(views)
+
+    def mark_dual(self, dual_views):
+        self.dual_views.update(dual_views)
+        self.mark_draw(dual_views)
+
+    def mark_crosshairs(self, view_controls):
+        self.crosshair_controls.add(view_controls)
+        self.mark_draw(view_controls.image_views)
+
+    def mark_slice(self, view_controls, view):
+        # new slice in one view; the crosshairs of the other two views move with it
+        self.mark_reload([view_controls.image_views[view]])
+        self.mark_crosshairs(view_controls)
+        self.mark_dual([self.app.image_3_views[view]])
+
+    def mark_image(self, view_controls, reload=True):
+        # every view of one volume, e.g. after a transform or while it loads
+        if reload:
+            self.mark_reload(view_controls.image_views)
+        else:
+            self.mark_data(view_controls.image_views)
+        self.mark_crosshairs(view_controls)
+        self.mark_dual(self.app.image_3_views)
+
+    # --- Rendering --- #
+
+    def render(self):
+        self.render_pending = False
+
+        reload_views, self.reload_views = self.reload_views, set()
+        data_views, self.data_views = self.data_views, set()
+        dual_views, self.dual_views = self.dual_views, set()
+        crosshair_controls, self.crosshair_controls = self.crosshair_controls, set()
+        draw_views, self.draw_views = self.draw_views, set()
+
+        for image_view in reload_views:
+            image_view.reload_slice()
+        for image_view in data_views:
+            image_view.update_data()
+
+        # fused views read the image views' arrays, so they go after them
+        for dual_view in dual_views:
+            dual_view.update_data()
+        for view_controls in crosshair_controls:
+            view_controls.update_crosshairs()
+
+        for view in draw_views:
+            view.draw()
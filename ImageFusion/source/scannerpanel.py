@@ -130,8 +130,26 @@ class ScannerPanel(DragDropMixIn, tk.Frame):
         self.image_view_2.pack(padx=0, pady=0, side='left', expand=True, fill='both')
         self.image_view_3.pack(padx=0, pady=0, side='left', expand=True, fill='both')
         
+        # loading progress (shown below the image views while a volume loads)
+        self.progress_frame = tk.Frame(self.image_views_frame)
+        self.progress_label = tk.Label(self.progress_frame, text='', anchor='w')
+        self.progress_bar = ttk.Progressbar(self.progress_frame, orient='horizontal', mode='determinate', maximum=1.0)
+        self.progress_label.pack(side='left', padx=2.5)
+        self.progress_bar.pack(side='left', padx=2.5, pady=2.5, expand=True, fill='x')
+        
         # set colors
         self.set_neutral_colors()
+    
+    def show_progress(self, text):
+        self.set_progress(0.0, text)
+        self.progress_frame.pack(side='bottom', fill='x', before=self.image_view_1)
+    
+    def set_progress(self, fraction, text):
+        self.progress_bar['value'] = fraction
+        self.progress_label['text'] = text
+    
+    def hide_progress(self):
+        self.progress_frame.pack_forget()
 
     def set_neutral_colors(self):
         
@@ -1,10 +1,11 @@
 import numpy as np
 import tkinter as tk
-from scipy.ndimage import affine_transform
+from tkinter import ttk
 from numba import jit
 import threading
 from PIL import Image, ImageTk, ImageSequence
 from functools import partial
+from source.registration import MutualInformationRegistration
 
 @jit(nopython=True)
 def compute_transform(P1, P2):
@@ -85,6 +86,23 @@ class TransformControls:
         self.make_button(transform_frame, "Compute", self.compute_transform_wrapper).pack(anchor='w', side='left', padx=2.5, pady=2.5)
         self.make_button(transform_frame, "Apply", self.apply_transform).pack(anchor='w', side='left', padx=2.5, pady=2.5)
         
+        # --- Automatic Registration --- #
+        
+        tk.Label(affine_frame_right, text="Automatic (MI)").pack(side='top', anchor='n')
+        registration_frame = tk.Frame(affine_frame_right)
+        registration_frame.pack(side='top', anchor='nw', padx=0, pady=5)
+        
+        self.registration = None
+        self.registration_mode = tk.StringVar(value='Rigid')
+        registration_mode_drop = ttk.OptionMenu(registration_frame, self.registration_mode, 'Rigid', 'Rigid', 'Affine')
+        registration_mode_drop.config(width=6)
+        registration_mode_drop.pack(anchor='w', side='left', padx=2.5, pady=2.5)
+        self.registration_button = self.make_button(registration_frame, "Auto", self.auto_register)
+        self.registration_button.pack(anchor='w', side='left', padx=2.5, pady=2.5)
+        
+        self.registration_label = tk.Label(affine_frame_right, text='', font=("Arial", 8))
+        self.registration_label.pack(side='top', anchor='w')
+        
         # --- Reset Transforms --- #
         
         self.make_button(self.parent_frame, "Reset Transforms", self.reset_transforms).pack(anchor='nw', side='top', padx=2.5, pady=2.5)
@@ -161,86 +179,12 @@ class TransformControls:
     
     def rotate(self, view, direction):
         
-        def rotate_slice_indices(x_view, y_view, z_view):
-            
-            # current slice indices
-            slice_0_index = self.image_controls.view_controls.views_slice_index[TRANSVERSE].get()
-            slice_1_index = self.image_controls.view_controls.views_slice_index[CORONAL].get()
-            slice_2_index = self.image_controls.view_controls.views_slice_index[SAGITTAL].get()
-            
-            x_slice_index = self.image_controls.view_controls.views_slice_index[x_view].get()
-            y_slice_index = self.image_controls.view_controls.views_slice_index[y_view].get()
-            x = self.image_controls.view_controls.image_views[x_view].get_mm_from_slice_number(x_slice_index)
-            y = self.image_controls.view_controls.image_views[y_view].get_mm_from_slice_number(y_slice_index)
-
-            if direction == 'clockwise':
-                t = y
-                y = -x
-                x = t
-            else: # direction == 'anticlockwise':
-                t = y
-                y = x
-                x = -t
-
-            if z_view == 0:
-                # x -> y = sagittal (2)
-                # y -> x = coronal (1)
-                slice_1_index = self.image_controls.view_controls.image_views[SAGITTAL].get_slice_number_from_mm(y)
-                slice_2_index = self.image_controls.view_controls.image_views[CORONAL].get_slice_number_from_mm(x)
-                
-            elif z_view == 1:
-                # x -> y = sagittal (2)
-                # y -> x = transverse (0)
-                slice_0_index = self.image_controls.view_controls.image_views[SAGITTAL].get_slice_number_from_mm(y)
-                slice_2_index = self.image_controls.view_controls.image_views[TRANSVERSE].get_slice_number_from_mm(x)
-                
-            else: # z_view == 2:
-                # x -> y coronal (1)
-                # y -> x transverse (0)
-                slice_0_index = self.image_controls.view_controls.image_views[CORONAL].get_slice_number_from_mm(y)
-                slice_1_index = self.image_controls.view_controls.image_views[TRANSVERSE].get_slice_number_from_mm(x)
-            
-            self.image_controls.view_controls.views_slice_index[0].set(slice_0_index)
-            self.image_controls.view_controls.views_slice_index[1].set(slice_1_index)
-            self.image_controls.view_controls.views_slice_index[2].set(slice_2_index)
-            
-        TRANSVERSE = 0
-        CORONAL = 1
-        SAGITTAL = 2
-        
+        # orientation only, the volume is not copied; crosshair indices are rotated by ImageData
         self.image_data.rotate_view(view, direction)
+        self.image_controls.view_controls.refresh_slice_sliders()
         
-        # rearrange slice numbers        
-        if view == 0: # transeverse
-            # x is sagittal (2), y is coronal (1)
-            rotate_slice_indices(SAGITTAL, CORONAL, TRANSVERSE)
-        
-        elif view == 1: # coronal
-            # x is sagittal (2), y is transverse (0)
-            rotate_slice_indices(SAGITTAL, TRANSVERSE, CORONAL)
-            
-        else: # view == 2: # sagittal
-            # x is coronal (1), y is transverse (0)
-            rotate_slice_indices(CORONAL, TRANSVERSE, SAGITTAL)
-        
-        # now fix all the "immutables" and refresh
-        for image_view in self.image_controls.image_views:
-            
-            # rearrange extent
-            extent = image_view.extent
-            temp_0 = extent[0]
-            temp_1 = extent[1]
-            extent[0] = extent[2]
-            extent[1] = extent[3]
-            extent[2] = temp_0
-            extent[3] = temp_1
-
-            # update image
-            image_view.extent = extent
-            image_view.reload_slice()
-            image_view.update_data()
-        
-        self.app.refresh_graphics()
+        # update data and graphics
+        self.app.render_scheduler.mark_image(self.image_controls.view_controls)
         
     def invert(self, view, direction):
         if view == 0: # transeverse
@@ -256,23 +200,20 @@ class TransformControls:
         self.image_data.invert_view(target_view)
         
         # update data and graphics
-        self.app.reload_slices()
-        self.app.refresh_data()
-        self.app.refresh_graphics()
+        self.app.render_scheduler.mark_image(self.image_controls.view_controls)
     
     def reset_transforms(self):
-        self.image_data.X = self.image_data.original_X.copy()
-        self.image_data.preload_slices()
-        self.image_data.refresh_characteristics()
+        self.image_data.reset_transforms()
+        if self.image_data is self.app.X_CT:
+            self.app.transform_preview.clear()
+        self.image_controls.view_controls.refresh_slice_sliders()
         
         self.image_controls.view_controls.set_view_slice(0, 0, 'by_mm', original_call=False)
         self.image_controls.view_controls.set_view_slice(1, 0, 'by_mm', original_call=False)
         self.image_controls.view_controls.set_view_slice(2, 0, 'by_mm', original_call=False)
         
         # update data and graphics
-        self.app.reload_slices()
-        self.app.refresh_data()
-        self.app.refresh_graphics()
+        self.app.render_scheduler.mark_image(self.image_controls.view_controls)
     
     # --- Affine Transform --- #
     
@@ -281,12 +222,14 @@ class TransformControls:
         point_text = ", ".join(f"{x:.2f}" for x in point)
         self.transform_points.append(point)
         self.transform_points_LB.insert(tk.END, point_text)
+        self.refresh_preview()
       
     def remove_point(self):
         if self.transform_points_LB.curselection():
             cursor_selection =self.transform_points_LB.curselection()[0]
             del self.transform_points[cursor_selection]
             self.transform_points_LB.delete(cursor_selection)
+            self.refresh_preview()
       
     def compute_transform_wrapper(self):
         if self.app.panel_1_controls.transform_controls.transform_points and self.app.panel_2_controls.transform_controls.transform_points:
@@ -302,41 +245,101 @@ class TransformControls:
             if P1.shape == P2.shape:
                 self.affine_matrix = compute_transform(P1, P2)
                 self.good_transform = True
+                
+                # preview on the displayed planes; the volume is only resampled by Apply
+                self.app.transform_preview.set_transform(*self.get_voxel_transform(), controls=self)
+                self.app.render_scheduler.mark_dual(self.app.image_3_views)
+                return
+        
+        if self.app.transform_preview.is_active():
+            self.app.transform_preview.clear()
+            self.app.render_scheduler.mark_dual(self.app.image_3_views)
     
-    def apply_transform(self):
+    def refresh_preview(self):
+        # a previewed transform follows the reference points as they are edited
+        preview = self.app.transform_preview
+        if preview.is_active() and preview.controls is not None:
+            preview.controls.compute_transform_wrapper()
+    
+    def get_voxel_transform(self):
         
         def create_scale_matrix(voxel_dims):
             scale_factors = np.diag(1 / voxel_dims)
             scale_factors_4x4 = np.eye(4)
             scale_factors_4x4[:3, :3] = scale_factors
             return scale_factors_4x4
+        
+        inverse_affine = np.linalg.inv(self.affine_matrix)
+        
+        # Scaling matrices
+        scale_factors_4x4 = create_scale_matrix(np.array(self.app.X_CT.vxl_dims))
+        inverse_scale_factors_4x4 = create_scale_matrix(1 / np.array(self.app.X_CT.vxl_dims))
+
+        # Convert affine matrix from mm space to voxel space
+        voxel_affine = scale_factors_4x4 @ inverse_affine @ inverse_scale_factors_4x4
+
+        # Extract rotation and translation
+        rotation = voxel_affine[:3, :3]
+        translation = voxel_affine[:3, 3]
+        return rotation, translation
     
-        def run_transformation():
-            if len(self.affine_matrix) > 0:
-                inverse_affine = np.linalg.inv(self.affine_matrix)
-                
-                # Scaling matrices
-                scale_factors_4x4 = create_scale_matrix(np.array(self.app.X_CT.vxl_dims))
-                inverse_scale_factors_4x4 = create_scale_matrix(1 / np.array(self.app.X_CT.vxl_dims))
+    # --- Automatic Registration --- #
     
-                # Convert affine matrix from mm space to voxel space
-                voxel_affine = scale_factors_4x4 @ inverse_affine @ inverse_scale_factors_4x4
+    def auto_register(self):
+        # a second click cancels a running registration
+        if self.registration is not None:
+            self.registration.cancel()
+            return
+        
+        if not (self.app.X_CT.loaded and self.app.X_PET.loaded):
+            return
+        
+        # CT (moving) onto PET (fixed), both as displayed
+        self.registration = MutualInformationRegistration(self.app.X_PET.X, self.app.X_PET.vxl_dims,
+                                                          self.app.X_CT.X, self.app.X_CT.vxl_dims,
+                                                          mode=self.registration_mode.get().lower())
+        self.registration.start()
+        self.registration_button.config(text="Cancel")
+        self.app.after(100, self.poll_registration)
     
-                # Extract rotation and translation
-                rotation = voxel_affine[:3, :3]
-                translation = voxel_affine[:3, 3]
+    def poll_registration(self):
+        registration = self.registration
+        done, total = registration.progress
+        
+        if not registration.finished:
+            self.registration_label['text'] = f'Registering {100 * done // total}%'
+            self.app.after(100, self.poll_registration)
+            return
+        
+        if registration.error:
+            self.registration_label['text'] = 'Registration failed'
+            print(f"Registration failed: {registration.error}")
+        elif registration.cancel_event.is_set():
+            self.registration_label['text'] = 'Registration cancelled'
+        else:
+            # handed to Apply like a computed fiducial transform, previewed until then
+            self.affine_matrix = registration.get_affine_matrix()
+            self.good_transform = True
+            self.app.transform_preview.set_transform(*self.get_voxel_transform())
+            self.app.render_scheduler.mark_dual(self.app.image_3_views)
+            self.registration_label['text'] = f'Registered (MI {registration.metric:.3f})'
+        
+        self.registration_button.config(text="Auto")
+        self.registration = None
     
-                # Apply the affine transformation to the image
-                self.app.X_CT.X = affine_transform(self.app.X_CT.X, rotation, offset=translation, order=1)
-                self.app.X_CT.preload_slices()
-                
-                # Refresh UI graphics
-                self.app.reload_slices()
-                self.app.refresh_data()
-                self.app.refresh_graphics()
-                
-                # Hide the loading screen once done
-                self.app.after(0, hide_loading)
+    def apply_transform(self):
+    
+        def run_transformation(resampling):
+            # only the resample runs here; the displayed volume is swapped on the Tk thread
+            resampling = self.app.X_CT.resample_source(resampling)
+            self.app.after(0, lambda: finish_transformation(resampling))
+    
+        def finish_transformation(resampling):
+            # the transform is part of the volume now
+            self.app.X_CT.set_resampled_volume(resampling)
+            self.app.transform_preview.clear()
+            self.app.render_scheduler.mark_image(self.app.panel_1_controls.view_controls)
+            hide_loading()
     
         def show_loading():
             self.app.update_idletasks()  # Ensure correct window size before creating overlay
@@ -374,10 +377,13 @@ class TransformControls:
         def hide_loading():
             self.loading_overlay.destroy()
     
-        if self.good_transform:
+        if self.good_transform and self.app.X_CT.loaded and len(self.affine_matrix) > 0:
+            
+            # Compose the affine with the earlier transforms, against the current orientation
+            resampling = self.app.X_CT.compose_affine(*self.get_voxel_transform())
             
             # Show the loading overlay
             show_loading()
         
-            # Run affine_transform in a separate thread
-            threading.Thread(target=run_transformation, daemon=True).start()
\ No newline at end of file
+            # Resample the original CT once, in a separate thread
+            threading.Thread(target=run_transformation, args=(resampling,), daemon=True).start()
\ No newline at end of file
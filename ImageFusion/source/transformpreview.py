@@ -0,0 +1,77 @@
+import numpy as np
+from scipy.ndimage import map_coordinates
+
+class TransformPreview:
+
+    # Displayed planes of a volume as they would look after apply_transform,
+    # without resampling the volume: only the pixels of the three current slices
+    # are mapped through the affine composed with the volume's transform and read
+    # from the source (map_coordinates, order 1, as ImageData.apply_affine does).
+    # The fused views show these while a transform is previewed.
+
+    def __init__(self, image_data):
+        self.image_data = image_data
+        self.matrix = None
+        self.offset = None
+        self.controls = None # TransformControls that computed the transform
+        self.slices = {}
+        self.colored = {}
+
+    def set_transform(self, matrix, offset, controls=None):
+        # voxel space: input coordinate = matrix @ output coordinate + offset
+        self.controls = controls
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.offset = np.asarray(offset, dtype=np.float64)
+        self.slices.clear()
+        self.colored.clear()
+
+    def clear(self):
+        self.matrix = self.offset = self.controls = None
+        self.slices.clear()
+        self.colored.clear()
+
+    def is_active(self):
+        return self.matrix is not None
+
+    # --- Slices --- #
+
+    def get_slice(self, view):
+        slice_number = self.image_data.slice_index[view]
+        key = (self.image_data.version, slice_number)
+        cached = self.slices.get(view)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        affine = np.eye(4)
+        affine[:3, :3] = self.matrix
+        affine[:3, 3] = self.offset
+        transform = self.image_data.get_transform() @ affine
+        
+        X = self.image_data.source_X
+        coordinates = self.get_coordinates(transform, view, slice_number, self.image_data.vxls_per_view)
+        image_slice = map_coordinates(X, coordinates, order=1, output=X.dtype)
+        self.slices[view] = (key, image_slice)
+        return image_slice
+
+    def get_coordinates(self, transform, view, slice_number, shape):
+        # source coordinates of every pixel in the plane, built from the two
+        # in-plane axes without a full output grid
+        rows_axis, columns_axis = [axis for axis in range(3) if axis != view]
+        rows = np.arange(shape[rows_axis])
+        columns = np.arange(shape[columns_axis])
+        matrix, offset = transform[:3, :3], transform[:3, 3]
+
+        coordinates = (matrix[:, view] * slice_number + offset)[:, None, None] \
+                    + matrix[:, rows_axis][:, None, None] * rows[None, :, None] \
+                    + matrix[:, columns_axis][:, None, None] * columns[None, None, :]
+        return coordinates
+
+    def get_rgba(self, image_view):
+        # colored with the view's colormap and window, recolored only when those change
+        image_slice = self.get_slice(image_view.view)
+        display_state = (image_view.cmap, tuple(image_view.intensity_limits), image_view.render_mode)
+        cached = self.colored.get(image_view.view)
+        if cached is None or cached[0] is not image_slice or cached[1] != display_state:
+            cached = (image_slice, display_state, image_view.colorize(image_slice))
+            self.colored[image_view.view] = cached
+        return cached[2]
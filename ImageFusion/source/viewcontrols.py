@@ -1,9 +1,11 @@
+import time
 import numpy as np
 import tkinter as tk
 from tkinter import ttk
 from RangeSlider.RangeSlider import RangeSliderV
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.collections import PolyCollection
 
 class ViewControls:
     
@@ -31,9 +33,9 @@ class ViewControls:
         slice_title = tk.Label(slice_sliders, text="Slice Controls")
         slice_title.pack(side='top', anchor='n')
         self.views_slice_index = [tk.IntVar(), tk.IntVar(), tk.IntVar()]
-        self.make_slice_slider(slice_sliders, view=0, name='T')
-        self.make_slice_slider(slice_sliders, view=1, name='C')
-        self.make_slice_slider(slice_sliders, view=2, name='S')
+        self.slice_sliders = [self.make_slice_slider(slice_sliders, view=0, name='T'),
+                              self.make_slice_slider(slice_sliders, view=1, name='C'),
+                              self.make_slice_slider(slice_sliders, view=2, name='S')]
         self.make_linked_images(slice_controls)
         
         # --- Display Frame --- #
@@ -66,6 +68,16 @@ class ViewControls:
         self.make_cursor_color_dropdown(cursor_top_frame)
         self.make_cursor_alpha_slider(cursor_bottom_frame)
         
+        # --- Cine Frame --- #
+        
+        cine_controls = tk.Frame(bottom_frame, bd=1, relief=tk.SUNKEN)
+        cine_controls.pack(side='left', anchor='n', padx=5, pady=5)
+        
+        cine_title = tk.Label(cine_controls, text="Cine")
+        cine_title.pack(side='top', anchor='n')
+        
+        self.make_cine_controls(cine_controls)
+        
         # --- Image Mouse Controls --- #
         
         for view, image_view in enumerate(self.image_views):
@@ -166,19 +178,38 @@ class ViewControls:
         
         # -- (right) histogram -- #
         
-        image = self.image_views[0].image_data.get_matrix().flatten()
-        
         px = 1/plt.rcParams['figure.dpi'] # pixel in inches
         self.int_fig = plt.Figure(figsize=(50*px,200*px))
         self.int_ax = self.int_fig.add_subplot()
-
+        self.int_fig.tight_layout(pad=0)
+        self.draw_histogram()
+        
+        self.hist_canvas = FigureCanvasTkAgg(self.int_fig, master=wrapper_frame)
+        self.hist_canvas.get_tk_widget().pack(side='left', padx=0, pady=0)
+        
+        return intensity_range_slider
+    
+    def draw_histogram(self):
+        
+        # redrawn once a volume that was still loading is complete
+        counts, bins = self.image_views[0].image_data.get_intensity_histogram(bins=100)
+        
+        self.int_ax.cla()
         self.int_ax.get_xaxis().set_ticks([])
         self.int_ax.get_yaxis().set_ticks([])
         self.int_ax.axis('off')
         self.int_ax.set_xscale('log')
-        self.int_fig.tight_layout(pad=0)
         
-        counts, bins, self.patches = self.int_ax.hist(image, bins=100, orientation='horizontal', color='black')
+        # one horizontal bar per bin in a single collection, recolored in one call;
+        # bars start below a count of one since the log axis has no zero
+        left = 0.5
+        right = np.maximum(counts, left)
+        vertices = np.stack([np.stack([np.full_like(right, left), bins[:-1]], axis=1),
+                             np.stack([right, bins[:-1]], axis=1),
+                             np.stack([right, bins[1:]], axis=1),
+                             np.stack([np.full_like(right, left), bins[1:]], axis=1)], axis=1)
+        self.hist_bars = PolyCollection(vertices, linewidths=0)
+        self.int_ax.add_collection(self.hist_bars)
         bin_centers = 0.5 * (bins[:-1] + bins[1:])
         
         # scale values to interval [0,1]
@@ -186,15 +217,10 @@ class ViewControls:
         self.scaled_bins = centered_bins/max(centered_bins)
         
         cm = plt.cm.get_cmap('gist_yarg')
-        for sb, p in zip(self.scaled_bins, self.patches):
-            plt.setp(p, 'facecolor', cm(sb))
+        self.hist_bars.set_facecolor(cm(self.scaled_bins))
     
+        self.int_ax.set_xlim([left, max(right.max(), 1) * 1.05])
         self.int_ax.set_ylim([0, bins[-1]])
-        
-        self.hist_canvas = FigureCanvasTkAgg(self.int_fig, master=wrapper_frame)
-        self.hist_canvas.get_tk_widget().pack(side='left', padx=0, pady=0)
-        
-        return intensity_range_slider
      
     def make_image_cmap_dropdown(self, parent):
         cmap_options = [
@@ -247,15 +273,13 @@ class ViewControls:
                 for image_view in self.image_views:
                     image_view.cursor_h.set_visible(True)
                     image_view.cursor_v.set_visible(True)
-                    image_view.update_data()
                     
             else:
                 for image_view in self.image_views:
                     image_view.cursor_h.set_visible(False)
                     image_view.cursor_v.set_visible(False)
-                    image_view.update_data()
                     
-            self.app.refresh_graphics()
+            self.app.render_scheduler.mark_data(self.image_views)
         
         self.cursor_toggle = tk.IntVar(value=1)
         self.cursor_checkbutton = tk.Checkbutton(parent, text="", onvalue=1, offvalue=0, 
@@ -271,9 +295,8 @@ class ViewControls:
             for image_view in self.image_views:
                 image_view.cursor_h.set_color(color)
                 image_view.cursor_v.set_color(color)
-                image_view.update_data()
                 
-            self.app.refresh_graphics()
+            self.app.render_scheduler.mark_data(self.image_views)
         
         cursor_color_options = {
             'black': (0.0, 0.0, 0.0),
@@ -298,8 +321,7 @@ class ViewControls:
                 image_view.cursor_h.set_alpha(slider.get())
                 image_view.cursor_v.set_alpha(slider.get())
             
-                image_view.update_data()
-            self.app.refresh_graphics()
+            self.app.render_scheduler.mark_data(self.image_views)
         
         def on_mouse_wheel(event):
             alpha = slider.get() + np.sign(event.delta) * slider_step
@@ -318,6 +340,107 @@ class ViewControls:
         slider_label.pack(side=tk.LEFT, anchor='w')
         slider.pack(side=tk.LEFT, anchor='w')
     
+    def make_cine_controls(self, parent):
+        
+        top_frame = tk.Frame(parent)
+        top_frame.pack(side=tk.TOP, anchor='nw')
+        
+        bottom_frame = tk.Frame(parent)
+        bottom_frame.pack(side=tk.TOP, anchor='nw')
+        
+        cine_views = {'T': 0, 'C': 1, 'S': 2}
+        self.cine_view = tk.StringVar(value='T')
+        cine_view_drop = tk.OptionMenu(top_frame, self.cine_view, *cine_views.keys())
+        cine_view_drop.config(width=2, anchor='w')
+        cine_view_drop.pack(side=tk.LEFT, anchor='n')
+        
+        self.cine_fps = tk.IntVar(value=10)
+        cine_fps_spinbox = tk.Spinbox(top_frame, from_=1, to=60, width=3, textvariable=self.cine_fps)
+        cine_fps_spinbox.pack(side=tk.LEFT, anchor='w', padx=2)
+        tk.Label(top_frame, text='fps').pack(side=tk.LEFT, anchor='w')
+        
+        self.cine_button = tk.Button(bottom_frame, text='▶', width=3,
+                                     command=lambda: self.toggle_cine(cine_views[self.cine_view.get()]))
+        self.cine_button.pack(side=tk.LEFT, anchor='w')
+        
+        self.cine_fps_label = tk.Label(bottom_frame, text='', width=10, anchor='w')
+        self.cine_fps_label.pack(side=tk.LEFT, anchor='w')
+        
+        self.cine_playing = False
+    
+    # --- Cine --- #
+    
+    def toggle_cine(self, view):
+        if self.cine_playing:
+            self.stop_cine()
+        else:
+            self.start_cine(view)
+    
+    def start_cine(self, view):
+        # the playhead follows the wall clock: frames that can't be rendered in time
+        # are skipped instead of slowing playback down
+        self.cine_playing = True
+        self.cine_button['text'] = '■'
+        self.cine_view_playing = view
+        self.restart_cine_clock(self.views_slice_index[view].get(), self.get_cine_fps())
+        self.cine_shown_slice = self.cine_start_slice
+        self.cine_shown_frames = 0
+        self.cine_report_time = time.perf_counter()
+        
+        # upcoming slices are prerendered by the frame cache, about a quarter second ahead
+        image_view = self.image_views[view]
+        image_view.scroll_direction = 1
+        image_view.prefetch_depth = max(4, int(np.ceil(self.get_cine_fps() / 4)))
+        
+        self.cine_tick()
+    
+    def restart_cine_clock(self, slice_number, fps):
+        self.cine_start_time = time.perf_counter()
+        self.cine_start_slice = slice_number
+        self.cine_clock_fps = fps
+    
+    def stop_cine(self):
+        self.cine_playing = False
+        self.cine_button['text'] = '▶'
+        self.cine_fps_label['text'] = ''
+        self.image_views[self.cine_view_playing].prefetch_depth = 4
+    
+    def get_cine_fps(self):
+        try:
+            return min(60, max(1, int(self.cine_fps.get())))
+        except tk.TclError:
+            return 1
+    
+    def cine_tick(self):
+        if not self.cine_playing:
+            return
+        
+        view = self.cine_view_playing
+        fps = self.get_cine_fps()
+        if fps != self.cine_clock_fps:
+            # rate changed while playing, continue from the current slice
+            self.restart_cine_clock(self.cine_shown_slice, fps)
+        slice_count = self.image_data.vxls_per_view[view]
+        now = time.perf_counter()
+        
+        frame = int((now - self.cine_start_time) * fps)
+        slice_number = (self.cine_start_slice + frame) % slice_count
+        if slice_number != self.cine_shown_slice:
+            self.cine_shown_slice = slice_number
+            self.cine_shown_frames += 1
+            self.set_view_slice(view, slice_number, 'by_number')
+        
+        # achieved vs. target rate, once a second
+        if now - self.cine_report_time >= 1.0:
+            achieved = self.cine_shown_frames / (now - self.cine_report_time)
+            self.cine_fps_label['text'] = f'{achieved:.1f}/{fps} fps'
+            self.cine_shown_frames = 0
+            self.cine_report_time = now
+        
+        # next tick at the next frame boundary
+        next_frame_time = self.cine_start_time + (frame + 1) / fps
+        self.app.after(max(1, int((next_frame_time - time.perf_counter()) * 1000)), self.cine_tick)
+    
     # --- Functions for setting view parameters --- #
 
     def set_intensity(self, ar_name, index, mode):            
@@ -329,7 +452,6 @@ class ViewControls:
         
         self.set_intensity_colors()
         self.update_dual_view()
-        self.app.refresh_graphics()
     
     def set_colormap(self, ar_name, index, mode):
         cmap = self.color_scheme.get()
@@ -337,7 +459,6 @@ class ViewControls:
             image_view.set_cmap(cmap)
         self.set_intensity_colors()
         self.update_dual_view()
-        self.app.refresh_graphics()
     
     def set_intensity_colors(self):
         cm = plt.cm.get_cmap(self.color_scheme.get())
@@ -351,21 +472,24 @@ class ViewControls:
 
         local_scaled_bins[lo_ind:hi_ind] = np.linspace(0, 1, num=hi_ind-lo_ind)
         
-        for sb, p in zip(local_scaled_bins, self.patches):
-            plt.setp(p, 'facecolor', cm(sb))
-            
+        self.hist_bars.set_facecolor(cm(local_scaled_bins))
         self.int_fig.patch.set_facecolor(cm(0))
-        self.hist_canvas.draw()
+        self.hist_canvas.draw_idle()
     
     def set_interpolation(self, ar_name, index, mode):
         for image_view in self.image_views:
             image_view.set_interpolation(self.interpolation.get())
             
         self.update_dual_view()
-        self.app.refresh_graphics()
     
     # --- Slice controls --- #
     
+    def refresh_slice_sliders(self):
+        # slice counts per view change when the volume is rotated
+        for view, slider in enumerate(self.slice_sliders):
+            slider.config(from_=self.image_data.vxls_per_view[view]-1)
+            self.views_slice_index[view].set(self.image_data.slice_index[view])
+    
     def set_view_slice(self, view, slice_indicator, mode, original_call=True):
         
         if mode == 'by_number':
@@ -378,16 +502,11 @@ class ViewControls:
         if self.linked_images.get() == 1 and original_call:
             self.app.panel_1_controls.view_controls.set_view_slice(view, slice_mm, 'by_mm', original_call=False)
             self.app.panel_2_controls.view_controls.set_view_slice(view, slice_mm, 'by_mm', original_call=False)
-            original_call = True
-        else:            
-            self.image_views[view].slice = self.image_data.get_slice_from_mm(view, slice_mm)
+        else:
+            # the slice is fetched at render time, so a burst of requests only reads the last one
             self.image_data.set_slice_from_mm(view, slice_mm)
             self.views_slice_index[view].set(slice_number)
-        
-        if original_call:
-            self.update_dual_view()
-            self.app.refresh_data()
-            self.app.refresh_graphics()
+            self.app.render_scheduler.mark_slice(self, view)
     
     def on_click(self, event, view):
         
@@ -459,5 +578,4 @@ class ViewControls:
             self.image_views[view].cursor_v.set_xdata(x)
     
     def update_dual_view(self):
-        for image_view in self.app.image_3_views:
-            image_view.update_data()
\ No newline at end of file
+        self.app.render_scheduler.mark_dual(self.app.image_3_views)
\ No newline at end of file
@@ -0,0 +1,139 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pydicom as dicom
+
+class VolumeCache:
+
+    def __init__(self, cache_dir, max_bytes=10 * 1024**3):
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    # --- Keys --- #
+
+    def get_source_signature(self, path):
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            return [stat.st_size, stat.st_mtime_ns]
+
+        # directories are keyed on their entries so adding/replacing a slice invalidates the entry
+        size, mtime, count = 0, 0, 0
+        for entry in os.scandir(path):
+            if entry.is_file():
+                stat = entry.stat()
+                size += stat.st_size
+                mtime = max(mtime, stat.st_mtime_ns)
+                count += 1
+        return [size, mtime, count]
+
+    def get_key(self, file_properties):
+        path = os.path.abspath(file_properties['path'])
+        key = {
+            "path": path,
+            "signature": self.get_source_signature(path),
+            "transverse_axis": file_properties.get('transverse_axis'),
+            "vxl_dim_size": file_properties.get('vxl_dim_size'),
+            "series_uid": file_properties.get('series_uid'),
+            }
+        return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    def get_entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    # --- Load / Store --- #
+
+    def load(self, file_properties):
+        entry_dir = self.get_entry_dir(self.get_key(file_properties))
+        meta_path = os.path.join(entry_dir, 'meta.json')
+
+        if not os.path.isfile(meta_path):
+            return None
+
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            meta['max_intensity'] = np.uint16(meta['max_intensity'])
+            meta['X'] = np.load(os.path.join(entry_dir, 'X.npy'), mmap_mode='r')
+            
+            # DICOM header of the source, so a cached volume exports like a decoded one
+            header_path = os.path.join(entry_dir, 'header.dcm')
+            meta['dcm'] = dicom.dcmread(header_path, force=True) if os.path.isfile(header_path) else None
+        except (OSError, KeyError, ValueError, dicom.errors.InvalidDicomError):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+        # mark as most recently used
+        os.utime(entry_dir)
+        return meta
+
+    def get_header(self, dcm):
+        # source dataset without its pixel data
+        header = dicom.Dataset()
+        for element in dcm:
+            if element.tag != dicom.tag.Tag('PixelData'):
+                header.add(element)
+        file_meta = getattr(dcm, 'file_meta', None)
+        header.preamble = b'\x00' * 128
+        header.file_meta = file_meta if file_meta is not None else dicom.dataset.FileMetaDataset()
+        if 'TransferSyntaxUID' not in header.file_meta:
+            header.file_meta.TransferSyntaxUID = dicom.uid.ExplicitVRLittleEndian
+        return header
+
+    def store(self, file_properties, X, vxl_dims, slope, intercept, max_intensity, dcm=None):
+        if X.nbytes > self.max_bytes:
+            return
+
+        key = self.get_key(file_properties)
+        entry_dir = self.get_entry_dir(key)
+        temp_dir = entry_dir + '.tmp'
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+
+        meta = {
+            "path": file_properties['path'],
+            "vxl_dims": [float(v) for v in vxl_dims],
+            "slope": float(slope),
+            "intercept": float(intercept),
+            "max_intensity": int(max_intensity),
+            }
+
+        try:
+            np.save(os.path.join(temp_dir, 'X.npy'), X)
+            if dcm is not None:
+                dicom.dcmwrite(os.path.join(temp_dir, 'header.dcm'), self.get_header(dcm))
+            with open(os.path.join(temp_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+
+            # publish the entry in one step so a partial write is never loaded
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(temp_dir, entry_dir)
+        except OSError as e:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            print(f'Volume cache write failed: {e}')
+            return
+
+        self.evict()
+
+    # --- Eviction --- #
+
+    def get_entry_size(self, entry_dir):
+        return sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_dir() and not entry.name.endswith('.tmp'):
+                entries.append((entry.stat().st_mtime, entry.path, self.get_entry_size(entry.path)))
+
+        # drop least recently used entries until the cache fits
+        entries.sort()
+        total = sum(size for _, _, size in entries)
+        for _, entry_dir, size in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from scipy.ndimage import affine_transform
+from source.affineresample import affine_resample, ENGINES
+
+# Both engines have to reproduce ndimage's order 1 resample voxel for voxel.
+
+def make_case(dtype):
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 60000, (21, 18, 15)).astype(dtype)
+    angle = np.deg2rad(11)
+    matrix = np.array([[np.cos(angle), -np.sin(angle), 0.0],
+                       [np.sin(angle), np.cos(angle), 0.0],
+                       [0.02, 0.0, 1.05]])
+    center = (np.array(X.shape) - 1) / 2
+    offset = center - matrix @ center + np.array([0.75, -1.5, 0.25])
+    return X, matrix, offset
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('dtype', [np.uint16, np.float32])
+def test_matches_affine_transform(engine, dtype):
+    X, matrix, offset = make_case(dtype)
+    expected = affine_transform(X, matrix, offset=offset, order=1)
+    resampled = affine_resample(X, matrix, offset, engine=engine, workers=3, slab_size=4)
+    if np.issubdtype(dtype, np.integer):
+        assert np.array_equal(resampled, expected)
+    else:
+        np.testing.assert_allclose(resampled, expected, rtol=1e-5, atol=1e-2)
+
+def test_writes_into_out():
+    X, matrix, offset = make_case(np.uint16)
+    out = np.empty_like(X)
+    assert affine_resample(X, matrix, offset, out=out) is out
+
+def test_unknown_engine():
+    X, matrix, offset = make_case(np.uint16)
+    with pytest.raises(ValueError):
+        affine_resample(X, matrix, offset, engine='gpu')
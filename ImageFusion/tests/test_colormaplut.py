@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+import matplotlib
+from matplotlib.colors import Normalize
+from source.colormaplut import get_colormap_lut, apply_colormap_lut
+
+# The LUT render path has to draw the same pixels as the matplotlib fallback
+# in ImageView.update_data.
+
+@pytest.mark.parametrize('vmin, vmax', [(0, 65535), (1000, 3000), (2000, 2000), (0, 0)])
+def test_lut_matches_normalize(vmin, vmax):
+    X = np.random.default_rng(0).integers(0, 4000, (32, 32)).astype(np.uint16)
+    X[0, :4] = [0, vmin, vmax, 65535]
+    cmap = matplotlib.colormaps['inferno']
+
+    expected = cmap(Normalize(vmin, vmax)(X), bytes=True)
+    lut = get_colormap_lut('inferno', vmin, vmax)
+    assert np.array_equal(apply_colormap_lut(X, lut), expected)
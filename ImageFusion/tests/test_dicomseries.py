@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import pydicom as dicom
+from pydicom.dataset import FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, CTImageStorage, generate_uid
+from source.dicomseries import DicomSeries
+
+# Slices are stacked in order along the slice normal, whatever order the files come in.
+
+def write_slice(file_path, value, series_uid, position=None, orientation=None, instance=None):
+    dcm = dicom.Dataset()
+    dcm.file_meta = FileMetaDataset()
+    dcm.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    dcm.SOPClassUID = CTImageStorage
+    dcm.SOPInstanceUID = generate_uid()
+    dcm.SeriesInstanceUID = series_uid
+    if position is not None:
+        dcm.ImagePositionPatient = list(position)
+        dcm.ImageOrientationPatient = list(orientation)
+    if instance is not None:
+        dcm.InstanceNumber = instance
+    dcm.Rows, dcm.Columns = 3, 4
+    dcm.SamplesPerPixel = 1
+    dcm.BitsAllocated = dcm.BitsStored = 16
+    dcm.HighBit = 15
+    dcm.PixelRepresentation = 0
+    dcm.PhotometricInterpretation = 'MONOCHROME2'
+    dcm.PixelData = np.full((3, 4), value, dtype=np.uint16).tobytes()
+    dcm.save_as(file_path, enforce_file_format=True)
+    return str(file_path)
+
+def read_order(files, **kwargs):
+    series = DicomSeries(files, workers=2, **kwargs)
+    series.scan_headers()
+    volume = series.read_volume()
+    return [int(image_slice[0, 0]) for image_slice in volume]
+
+@pytest.mark.parametrize('orientation', [[1, 0, 0, 0, 1, 0], [1, 0, 0, 0, 0.8, -0.6]])
+def test_orders_by_position_along_normal(tmp_path, orientation):
+    normal = np.cross(orientation[:3], orientation[3:])
+    series_uid = generate_uid()
+    # file names and instance numbers disagree with the positions
+    values = [3, 0, 4, 1, 2]
+    files = [write_slice(tmp_path / f'{index}.dcm', value, series_uid,
+                         position=normal * 2.5 * value + [10, -20, 5], orientation=orientation,
+                         instance=10 - index)
+             for index, value in enumerate(values)]
+    assert read_order(files) == [0, 1, 2, 3, 4]
+
+def test_falls_back_to_instance_number(tmp_path):
+    series_uid = generate_uid()
+    files = [write_slice(tmp_path / f'{index}.dcm', value, series_uid, instance=value + 1)
+             for index, value in enumerate([2, 0, 1])]
+    assert read_order(files) == [0, 1, 2]
+
+def test_loads_largest_or_requested_series(tmp_path):
+    large, small = generate_uid(), generate_uid()
+    files = [write_slice(tmp_path / f'a{value}.dcm', value, large, instance=value) for value in [1, 0, 2]]
+    files += [write_slice(tmp_path / f'b{value}.dcm', 100 + value, small, instance=value) for value in [1, 0]]
+    (tmp_path / 'notes.txt').write_text('not dicom')
+    files.append(str(tmp_path / 'notes.txt'))
+
+    assert read_order(files) == [0, 1, 2]
+    assert read_order(files, series_uid=small) == [100, 101]
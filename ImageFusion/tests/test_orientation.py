@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from source.orientation import Orientation
+
+# Orientation only tracks perm/flips; applied to the volume it has to match the
+# numpy operations it stands for.
+
+def make_volume():
+    return np.arange(3 * 4 * 5).reshape(3, 4, 5)
+
+def random_operations(seed, count=12):
+    rng = np.random.default_rng(seed)
+    operations = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            operations.append(('flip', int(rng.integers(3))))
+        else:
+            axes = tuple(int(axis) for axis in rng.choice(3, size=2, replace=False))
+            operations.append(('rotate', int(rng.integers(1, 4)), axes))
+    return operations
+
+@pytest.mark.parametrize('seed', range(20))
+def test_apply_matches_numpy(seed):
+    X = make_volume()
+    orientation = Orientation()
+    expected = X
+    for operation in random_operations(seed):
+        if operation[0] == 'flip':
+            orientation.flip(operation[1])
+            expected = np.flip(expected, operation[1])
+        else:
+            orientation.rotate(operation[1], operation[2])
+            expected = np.rot90(expected, operation[1], operation[2])
+
+    displayed = orientation.apply(X)
+    assert np.array_equal(displayed, expected)
+    assert np.array_equal(displayed, np.transpose(X, orientation.perm)[
+        tuple(slice(None, None, -1) if flip else slice(None) for flip in orientation.flips)])
+    assert orientation.permute(X.shape) == list(expected.shape)
+
+    for view in range(3):
+        for slice_number in range(expected.shape[view]):
+            assert np.array_equal(orientation.get_slice(X, view, slice_number),
+                                  np.take(expected, slice_number, axis=view))
+
+    # displayed voxel -> stored voxel
+    matrix = orientation.get_matrix(X.shape)
+    for index in np.ndindex(*expected.shape):
+        stored = (matrix @ np.array(index + (1,)))[:3].astype(int)
+        assert expected[index] == X[tuple(stored)]
+
+def test_rotations_round_trip():
+    orientation = Orientation()
+    for axes in [(0, 1), (1, 2), (0, 2)]:
+        orientation.rotate(1, axes)
+        orientation.rotate(3, axes)
+        assert orientation.is_identity()
+    orientation.flip(2)
+    orientation.flip(2)
+    assert orientation.is_identity()
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from source.quantization import quantize_block, quantize_to_uint16, get_min_max, get_slope_intercept, UINT16_MAX
+
+# Block-wise quantization has to stay within 1 LSB of rescaling the whole volume at once.
+
+def quantize_whole(X):
+    min_value, max_value = float(X.min()), float(X.max())
+    return ((X.astype(np.float64) - min_value) / (max_value - min_value) * UINT16_MAX).astype(np.uint16)
+
+@pytest.mark.parametrize('dtype', [np.int16, np.float32, np.float64])
+def test_blocks_within_one_lsb(dtype):
+    X = (np.random.default_rng(0).normal(0, 800, (17, 12, 10)) - 1024).astype(dtype)
+    expected = quantize_whole(X)
+    min_value, max_value = get_min_max(X, slab_bytes=X[0].nbytes * 3)
+    assert (min_value, max_value) == (X.min(), X.max())
+
+    out = np.empty(X.shape, dtype=np.uint16)
+    buffer = np.empty((4,) + X.shape[1:], dtype=np.float64)
+    for start in range(0, X.shape[0], 4):
+        stop = min(start + 4, X.shape[0])
+        quantize_block(X[start:stop], min_value, max_value, out[start:stop], buffer[:stop - start])
+
+    assert np.abs(out.astype(np.int64) - expected).max() <= 1
+    assert out.min() == 0 and out.max() == UINT16_MAX
+
+    X_out, slope, intercept = quantize_to_uint16(X, slab_bytes=X[0].size * 8 * 5)
+    assert np.abs(X_out.astype(np.int64) - expected).max() <= 1
+    np.testing.assert_allclose(X_out * slope + intercept, X, atol=slope)
+
+def test_constant_volume():
+    X = np.full((3, 4, 4), 7.5)
+    X_out, slope, intercept = quantize_to_uint16(X)
+    assert not X_out.any()
+    assert (slope, intercept) == get_slope_intercept(7.5, 7.5) == (1.0, 7.5)